@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2010-2017 GEM Foundation
+#
+# The Site Response Toolkit (SRTK) is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# SRTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# with this download. If not, see <http://www.gnu.org/licenses/>
+#
+# Author: Poggi Valerio
+
+"""
+Benchmark suite of the SRTK computational kernels.
+
+Each kernel is timed along one or more scaling axes (layers,
+frequencies, models, sites, samples), varying one axis at a time
+from a base configuration. Results (timing, throughput and peak
+memory) are written to a JSON file, which can be compared against
+a previous run to catch regressions.
+
+Usage (from the repository root):
+  python Benchmarks/RunBenchmarks.py -o results.json
+  python Benchmarks/RunBenchmarks.py -o new.json -c old.json
+  python Benchmarks/RunBenchmarks.py --quick --only ShTransferFunction
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'Tests'))
+
+import OQSrtk.SiteMethods as sm
+import OQSrtk.AsciiTools as at
+
+from Synthetic import Profiles
+
+try:
+  import tracemalloc
+except ImportError:
+  tracemalloc = None
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+#-----------------------------------------------------------------------------------------
+# Base configuration and scaling axes
+
+BASE = {'models': 100,
+        'layers': 10,
+        'freqs': 500,
+        'depths': 5,
+        'sites': 10000,
+        'samples': 100000,
+        'channels': 3}
+
+AXES = {'models': [1, 10, 100, 1000],
+        'layers': [5, 10, 20, 50],
+        'freqs': [100, 500, 2000, 10000],
+        'depths': [1, 5, 20],
+        'sites': [1000, 10000, 100000],
+        'samples': [10000, 100000, 1000000]}
+
+QUICK = {'models': [1, 100],
+         'layers': [5, 20],
+         'freqs': [100, 1000],
+         'depths': [1, 5],
+         'sites': [1000, 10000],
+         'samples': [10000, 100000]}
+
+#-----------------------------------------------------------------------------------------
+# Input generators (fixed seeds, for reproducibility)
+
+def Spectra(Models, Freqs, Seed=0):
+  """
+  Stack of amplification functions with several resonances.
+  """
+
+  Hl, Vs, Dn, Qs = Profiles(Models, BASE['layers'], Seed)
+  Freq = sm.FrequencyAxis(0.1, 100., Freqs)
+
+  return Freq, np.abs(sm.ShTransferFunction(Hl, Vs, Dn, Qs, Freq)[...,0])
+
+def AsciiFile(Sites, Path, Seed=0):
+  """
+  Write a csv table of Sites rows (site list like) and return its name.
+  """
+
+  R = np.random.RandomState(Seed)
+  Name = os.path.join(Path, 'table_{0}.csv'.format(Sites))
+
+  np.savetxt(Name, R.uniform(0., 1000., (Sites, 6)), fmt='%.6f',
+             delimiter=',', header='Id,X,Y,Z,A,B', comments='')
+
+  return Name
+
+def Signal(Samples, Channels, Seed=0):
+  """
+  Multi-channel record of white noise (Signals.Record).
+  """
+
+  import OQSrtk.Signals as sg
+
+  R = np.random.RandomState(Seed)
+
+  Rec = sg.Record()
+  Rec.HDR['NSMP'] = Samples
+  Rec.HDR['TSMP'] = 0.01
+  Rec.HDR['NCHN'] = Channels
+  Rec.CHN = R.randn(Channels, Samples)
+
+  return Rec
+
+def SacFile(Samples, Path, Seed=0):
+  """
+  Write a SAC file of white noise and return its name.
+  """
+
+  import OQSrtk.SacTools as st
+
+  R = np.random.RandomState(Seed)
+  Name = os.path.join(Path, 'trace_{0}.sac'.format(Samples))
+
+  S = st.Sac()
+  S.Head = {'DELTA': 0.01, 'KSTNM': 'BENCH', 'KCMPNM': 'HHZ'}
+  S.Data = [R.randn(Samples)]
+  S.Write(Name)
+
+  return Name
+
+def SacRead(Name):
+  """
+  Read a SAC file (memory-mapped) and reduce its samples.
+  """
+
+  import OQSrtk.SacTools as st
+
+  return st.Sac(Name).Data[0].sum()
+
+#-----------------------------------------------------------------------------------------
+# Benchmark cases
+# Each case has: scaling axes, a setup function (not timed) returning
+# the inputs, the kernel call and the number of processed items.
+
+def _Setup(P, Path):
+  return Profiles(P['models'], P['layers'])
+
+def _Depths(P):
+  return list(np.linspace(5., 100., P['depths']))
+
+CASES = [
+
+  ('ShTransferFunction', ['layers', 'freqs', 'models'],
+   lambda P, Path: (_Setup(P, Path), sm.FrequencyAxis(0.1, 100., P['freqs'])),
+   lambda D: sm.ShTransferFunction(*(D[0] + (D[1],))),
+   lambda P: P['models']*P['freqs']),
+
+  # Iterative solver (single profile, few frequencies)
+  ('QwlApproxSolver', ['layers'],
+   lambda P, Path: ([X[0] for X in Profiles(1, P['layers'])[:3]],
+                    sm.FrequencyAxis(0.1, 100., 50)),
+   lambda D: sm.QwlApproxSolver(*(D[0] + [D[1]])),
+   lambda P: 50),
+
+  ('QwlExactSolver', ['layers', 'freqs', 'models'],
+   lambda P, Path: (_Setup(P, Path)[:3], sm.FrequencyAxis(0.1, 100., P['freqs'])),
+   lambda D: sm.QwlExactSolver(*(D[0] + (D[1],))),
+   lambda P: P['models']*P['freqs']),
+
+  ('DepthAverage', ['layers', 'models', 'depths'],
+   lambda P, Path: (_Setup(P, Path), _Depths(P)),
+   lambda D: sm.DepthAverage(D[0][0].shape[-1], D[0][0], D[0][2], D[1]),
+   lambda P: P['models']*P['depths']),
+
+  ('TTAverageVelocity', ['layers', 'models', 'depths'],
+   lambda P, Path: (_Setup(P, Path), _Depths(P)),
+   lambda D: sm.TTAverageVelocity(D[0][0], D[0][1], D[1]),
+   lambda P: P['models']*P['depths']),
+
+  ('Kappa0', ['layers', 'models'],
+   lambda P, Path: _Setup(P, Path),
+   lambda D: sm.Kappa0(D[0], D[1], D[3]),
+   lambda P: P['models']),
+
+  ('GetResFreq', ['freqs', 'models'],
+   lambda P, Path: Spectra(P['models'], P['freqs']),
+   lambda D: sm.GetResFreq(D[0], D[1]),
+   lambda P: P['models']*P['freqs']),
+
+  ('AsciiTable.Import', ['sites'],
+   lambda P, Path: AsciiFile(P['sites'], Path),
+   lambda D: at.AsciiTable().Import(D),
+   lambda P: P['sites']),
+
+  ('Record.Filter', ['samples'],
+   lambda P, Path: Signal(P['samples'], P['channels']),
+   lambda D: D.Filter(0.1, 20., 4),
+   lambda P: P['samples']*P['channels']),
+
+  # Read and touch all samples
+  ('SacTools.Sac', ['samples'],
+   lambda P, Path: SacFile(P['samples'], Path),
+   lambda D: SacRead(D),
+   lambda P: P['samples']),
+]
+
+#-----------------------------------------------------------------------------------------
+# Measurement
+
+def Measure(Func, Data, Repeat):
+  """
+  Time a kernel call (Repeat times) and measure its peak memory.
+  Peak memory is traced with tracemalloc when available, otherwise
+  taken from the growth of the process resident set (resource).
+  """
+
+  # Memory is measured first, as the resident set peak
+  # cannot be reset after the timing runs
+  Peak, Method = None, None
+  gc.collect()
+
+  if tracemalloc is not None:
+    tracemalloc.start()
+    Func(Data)
+    Peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    Method = 'tracemalloc'
+
+  elif resource is not None:
+    M0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    Func(Data)
+    M1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    Scale = 1. if sys.platform == 'darwin' else 1024.
+    Peak = (M1 - M0)*Scale
+    Method = 'maxrss'
+
+  Time = []
+
+  for R in range(Repeat):
+    gc.collect()
+    T0 = time.time()
+    Func(Data)
+    Time.append(time.time() - T0)
+
+  return {'time_min': min(Time),
+          'time_median': float(np.median(Time)),
+          'peak_mb': None if Peak is None else Peak/2.**20,
+          'memory_method': Method}
+
+def RunCase(Task):
+  """
+  Run a single case point (name, axis, value). When run in a separate
+  process, the resident set peak is not affected by previous cases.
+  """
+
+  Name, Axis, Value, Repeat, Path = Task
+  Case = [C for C in CASES if C[0] == Name][0]
+
+  P = dict(BASE)
+  P[Axis] = Value
+
+  Out = {'name': Name, 'axis': Axis, 'value': Value, 'params': P}
+
+  try:
+    Data = Case[2](P, Path)
+    Out.update(Measure(Case[3], Data, Repeat))
+    Out['items'] = Case[4](P)
+    Out['throughput'] = Out['items']/max(Out['time_min'], 1e-9)
+  except Exception as E:
+    Out['error'] = '{0}: {1}'.format(type(E).__name__, E)
+
+  return Out
+
+#-----------------------------------------------------------------------------------------
+
+def Meta():
+  """
+  Description of the benchmark environment.
+  """
+
+  Info = {'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+          'python': platform.python_version(),
+          'numpy': np.__version__,
+          'platform': platform.platform(),
+          'processor': platform.processor(),
+          'cpus': multiprocessing.cpu_count()}
+
+  try:
+    import scipy
+    Info['scipy'] = scipy.__version__
+  except ImportError:
+    pass
+
+  try:
+    Info['commit'] = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                             cwd=ROOT).decode('ascii').strip()
+  except Exception:
+    Info['commit'] = ''
+
+  return Info
+
+def Compare(New, Old, Tolerance):
+  """
+  Compare two result sets. Output is the list of regressions
+  (time or memory increase larger than Tolerance).
+  """
+
+  Ref = dict(((R['name'], R['axis'], R['value']), R) for R in Old['results']
+             if 'error' not in R)
+
+  Reg = []
+
+  print('\n{0:<20} {1:>8} {2:>10} {3:>10} {4:>10}'.format('case', 'axis', 'value',
+                                                          'time', 'memory'))
+
+  for R in New['results']:
+    K = (R['name'], R['axis'], R['value'])
+    if 'error' in R or K not in Ref:
+      continue
+
+    Rt = R['time_min']/max(Ref[K]['time_min'], 1e-9)
+    Rm = None
+    if R['peak_mb'] and Ref[K]['peak_mb']:
+      Rm = R['peak_mb']/Ref[K]['peak_mb']
+
+    Flag = ''
+    if Rt > 1. + Tolerance or (Rm is not None and Rm > 1. + Tolerance):
+      Flag = 'REGRESSION'
+      Reg.append(K)
+
+    print('{0:<20} {1:>8} {2:>10} {3:>9.2f}x {4:>10} {5}'.format(
+          K[0], K[1], K[2], Rt, '-' if Rm is None else '{0:.2f}x'.format(Rm), Flag))
+
+  return Reg
+
+#-----------------------------------------------------------------------------------------
+
+def Main():
+
+  Parser = argparse.ArgumentParser(description='SRTK benchmark suite')
+  Parser.add_argument('-o', '--output', default='benchmarks.json',
+                      help='output JSON file')
+  Parser.add_argument('-c', '--compare', default='',
+                      help='reference JSON file to compare with')
+  Parser.add_argument('-r', '--repeat', type=int, default=5,
+                      help='repetitions of each measurement')
+  Parser.add_argument('-t', '--tolerance', type=float, default=0.2,
+                      help='relative tolerance for regressions')
+  Parser.add_argument('--only', nargs='*', default=[],
+                      help='run only the given cases')
+  Parser.add_argument('--quick', action='store_true',
+                      help='reduced scaling axes')
+  Parser.add_argument('--inline', action='store_true',
+                      help='run cases in the main process')
+  Args = Parser.parse_args()
+
+  Axes = QUICK if Args.quick else AXES
+  Path = tempfile.mkdtemp(prefix='srtk_bench_')
+
+  Task = [(C[0], A, V, Args.repeat, Path) for C in CASES
+          if not Args.only or C[0] in Args.only
+          for A in C[1] for V in Axes[A]]
+
+  Results = []
+
+  try:
+    for T in Task:
+      if Args.inline:
+        R = RunCase(T)
+      else:
+        Pool = multiprocessing.Pool(1)
+        try:
+          R = Pool.apply(RunCase, (T,))
+        finally:
+          Pool.close()
+          Pool.join()
+
+      if 'error' in R:
+        print('{0:<20} {1:>8}={2:<8} skipped ({3})'.format(R['name'], R['axis'],
+                                                         R['value'], R['error']))
+      else:
+        print('{0:<20} {1:>8}={2:<8} {3:10.4f} s {4:12.0f} items/s {5:>8} MB'.format(
+              R['name'], R['axis'], R['value'], R['time_min'], R['throughput'],
+              '-' if R['peak_mb'] is None else '{0:.1f}'.format(R['peak_mb'])))
+
+      Results.append(R)
+
+  finally:
+    shutil.rmtree(Path, ignore_errors=True)
+
+  Out = {'meta': Meta(), 'base': BASE, 'results': Results}
+
+  with open(Args.output, 'w') as f:
+    json.dump(Out, f, indent=1, sort_keys=True)
+
+  if Args.compare:
+    with open(Args.compare, 'r') as f:
+      Reg = Compare(Out, json.load(f), Args.tolerance)
+    if Reg:
+      print('\n{0} regression(s) found'.format(len(Reg)))
+      sys.exit(1)
+
+if __name__ == '__main__':
+  Main()
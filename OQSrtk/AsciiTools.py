@@ -25,7 +25,7 @@ import copy as cp
 import numpy as np
 import fnmatch as fnm
 
-class AsciiTable():
+class AsciiTable(object):
 
   def __init__(self, header=[]):
 
@@ -37,6 +37,28 @@ class AsciiTable():
     self.data = []
 
 
+  @property
+  def data(self):
+    """
+    List of data rows (dictionaries with header's keys).
+    If the table was imported as a numerical array, rows are
+    created on first access (and the array is then dropped).
+    """
+
+    if self._data is None:
+      self._data = [dict(zip(self.header, row)) for row in self.array.tolist()]
+      self.array = None
+
+    return self._data
+
+
+  @data.setter
+  def data(self, data):
+
+    self._data = data
+    self.array = None
+
+
   def AddElement(self, data=[]):
     """
     Add an element (with header's format) to the data structure.
@@ -146,6 +168,8 @@ class AsciiTable():
                    empty=[]):
     """
     Method to import data from ascii file (tabular)
+    Homogeneous numerical tables (single int/float dtype) are
+    parsed in one pass and stored as array (see data property).
     """
 
     # Open input ascii file
@@ -167,8 +191,33 @@ class AsciiTable():
         if h != '':
           self.header.append(h)
 
+      # Data lines (skip comments and blank lines)
+      lines = [l for l in f.read().splitlines() if l.strip() and l[0] != comment]
+
+      # Fast parsing of numerical tables
+      if type(dtype) != list and dtype in _NumTypes:
+
+        array = _FastParse(lines, len(header), delimiter)
+
+        # Non-integer values are left to the standard parser
+        if array is not None and dtype in _NumTypes[:4]:
+          if np.any(array != np.round(array)):
+            array = None
+
+        if array is not None:
+          keep = [i for i, h in enumerate(header) if h != '']
+          array = array[:,keep]
+          if dtype in _NumTypes[:4]:
+            array = array.astype('int')
+
+          self._data = None
+          self.array = array
+
+          f.close()
+          return
+
       # Loop over lines
-      for line in f:
+      for line in lines:
 
          # Skip comments, if any
         if line[0] != comment:
@@ -293,6 +342,35 @@ class AsciiTable():
     return NewTab
 
 
+# Numerical data types (int first)
+_NumTypes = ['Int','int','I','i','Float','float','F','f']
+
+
+def _FastParse(lines, ncol, delimiter):
+  """
+  Private method to parse a block of numerical lines in one pass.
+  It returns None if the table is not regular (e.g. empty fields),
+  so that the standard parser can be used.
+  """
+
+  # Delimiters are converted to white spaces
+  if delimiter.strip():
+    if not all(l.count(delimiter) == ncol-1 for l in lines):
+      return None
+    text = ' '.join(lines).replace(delimiter, ' ')
+  else:
+    if not all(len(l.split()) == ncol for l in lines):
+      return None
+    text = ' '.join(lines)
+
+  array = np.fromstring(text, sep=' ')
+
+  if array.size != len(lines)*ncol:
+    return None
+
+  return array.reshape(len(lines), ncol)
+
+
 def _CastValue(value, dtype='float'):
   """
   Private method to recast variables.
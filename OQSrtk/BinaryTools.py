@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2010-2017 GEM Foundation
+#
+# The Site Response Toolkit (SRTK) is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# SRTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# with this download. If not, see <http://www.gnu.org/licenses/>
+#
+# Author: Poggi Valerio
+
+"""
+A simple tool to store named numerical arrays (blocks) into a single
+binary file, which can be loaded back using memory mapping.
+
+File structure:
+  - Magic string (8 bytes)
+  - Header length (uint64, little endian)
+  - Header (JSON): meta information, dtype/shape/offset of each block
+  - Raw data blocks (C order), aligned to 64 bytes
+"""
+
+import json as _js
+import struct as _st
+import numpy as _np
+
+#-----------------------------------------------------------------------------------------
+
+Magic = b'SRTKBIN1'
+
+# Alignment of data blocks (bytes)
+Align = 64
+
+# Text type of decoded JSON strings (unicode in Python 2)
+try:
+  _Text = unicode
+except NameError:
+  _Text = str
+
+#-----------------------------------------------------------------------------------------
+
+def Write(BinFile, Block, Meta={}):
+  """
+  Write a dictionary of arrays (Block) and a dictionary of
+  additional information (Meta, must be JSON serialisable)
+  into a binary file.
+  """
+
+  Head = {'Meta': Meta, 'Block': {}}
+
+  # Block offsets (relative to the start of the data section)
+  Off = 0
+  for K in sorted(Block.keys()):
+    A = _np.ascontiguousarray(Block[K])
+    Head['Block'][K] = {'dtype': A.dtype.str,
+                        'shape': list(A.shape),
+                        'offset': Off}
+    Off += _Pad(A.nbytes)
+
+  Head = _js.dumps(Head).encode('utf-8')
+
+  with open(BinFile, 'wb') as f:
+
+    f.write(Magic)
+    f.write(_st.pack('<Q', len(Head)))
+    f.write(Head)
+
+    # Blocks are written in offset order (with alignment padding)
+    for K in sorted(Block.keys()):
+      A = _np.ascontiguousarray(Block[K])
+      f.write(b'\0' * (_Pad(f.tell()) - f.tell()))
+      f.write(A.tobytes())
+
+    f.close()
+
+#-----------------------------------------------------------------------------------------
+
+def Read(BinFile, MemMap=True):
+  """
+  Read arrays and meta information from a binary file.
+  With MemMap, arrays are memory-mapped (copy-on-write) and
+  data are loaded from disk only when accessed.
+  Output is a tuple (Block, Meta); strings of Meta are native
+  strings (str).
+  """
+
+  with open(BinFile, 'rb') as f:
+
+    if f.read(len(Magic)) != Magic:
+      raise ValueError('Not a binary SRTK file: {0}'.format(BinFile))
+
+    Size = _st.unpack('<Q', f.read(8))[0]
+    Head = _Native(_js.loads(f.read(Size).decode('utf-8')))
+    Start = _Pad(len(Magic) + 8 + Size)
+
+    Block = {}
+
+    for K, B in Head['Block'].items():
+
+      DType = _np.dtype(str(B['dtype']))
+      Shape = tuple(B['shape'])
+      Count = int(_np.prod(Shape))
+
+      if Count == 0:
+        Block[K] = _np.zeros(Shape, dtype=DType)
+
+      elif MemMap:
+        Block[K] = _np.memmap(BinFile, dtype=DType,
+                                       mode='c',
+                                       offset=Start + B['offset'],
+                                       shape=Shape)
+      else:
+        f.seek(Start + B['offset'])
+        Block[K] = _np.fromfile(f, dtype=DType, count=Count).reshape(Shape)
+
+    f.close()
+
+  return Block, Head['Meta']
+
+#-----------------------------------------------------------------------------------------
+
+def _Pad(Size):
+  """
+  Private function to round a size to the block alignment.
+  """
+
+  return Align*((Size + Align - 1)//Align)
+
+#-----------------------------------------------------------------------------------------
+
+def _Native(Obj):
+  """
+  Private function to convert the strings of decoded JSON data
+  (also in nested lists and dictionaries) to native strings.
+  """
+
+  if isinstance(Obj, dict):
+    return dict((_Native(K), _Native(V)) for K, V in Obj.items())
+
+  if isinstance(Obj, list):
+    return [_Native(V) for V in Obj]
+
+  if isinstance(Obj, _Text) and not isinstance(Obj, str):
+    return Obj.encode('utf-8')
+
+  return Obj
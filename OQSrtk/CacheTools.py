@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2010-2017 GEM Foundation
+#
+# The Site Response Toolkit (SRTK) is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# SRTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# with this download. If not, see <http://www.gnu.org/licenses/>
+#
+# Author: Poggi Valerio
+
+"""
+Content-addressed cache for computation results (e.g. transfer
+functions of identical soil profiles). Results are identified by
+a hash of their input data and kept in a bounded LRU memory store,
+optionally backed by a directory on disk.
+"""
+
+import os as _os
+import hashlib as _hl
+import collections as _cl
+import numpy as _np
+
+#-----------------------------------------------------------------------------------------
+
+# Cache used by the site computations (disabled if None)
+Default = None
+
+#-----------------------------------------------------------------------------------------
+
+class Cache(object):
+  """
+  Bounded LRU cache of results (tuples of arrays).
+  Size is the maximum number of results kept in memory,
+  Path is an optional directory for persistent storage.
+  """
+
+  def __init__(self, Size=1000, Path=''):
+
+    self.Size = int(Size)
+    self.Path = Path
+    self.Data = _cl.OrderedDict()
+
+    self.Hits = 0
+    self.Misses = 0
+
+    if Path and not _os.path.isdir(Path):
+      _os.makedirs(Path)
+
+  #---------------------------------------------------------------------------------------
+
+  def Key(self, *Items):
+    """
+    Compute the hash key of an arbitrary sequence of arrays and scalars.
+    """
+
+    H = _hl.sha1()
+
+    for I in Items:
+      if isinstance(I, _np.ndarray):
+        I = _np.ascontiguousarray(I)
+        H.update(repr((I.dtype.str, I.shape)).encode('utf-8'))
+        H.update(I.tobytes())
+      else:
+        H.update(repr(I).encode('utf-8'))
+
+    return H.hexdigest()
+
+  #---------------------------------------------------------------------------------------
+
+  def Get(self, Key):
+    """
+    Return a copy of a stored result, or None if not found.
+    """
+
+    if Key in self.Data:
+      Value = self.Data.pop(Key)
+      self.Data[Key] = Value
+
+    elif self.Path and _os.path.isfile(self._File(Key)):
+      with _np.load(self._File(Key)) as F:
+        Value = tuple(F['arr_{0}'.format(I)] for I in range(len(F.files)))
+      self._Store(Key, Value)
+
+    else:
+      self.Misses += 1
+      return None
+
+    self.Hits += 1
+    return tuple(V.copy() for V in Value)
+
+  #---------------------------------------------------------------------------------------
+
+  def Put(self, Key, Value):
+    """
+    Store a result (tuple of arrays).
+    """
+
+    Value = tuple(_np.array(V) for V in Value)
+    self._Store(Key, Value)
+
+    if self.Path:
+      _np.savez(self._File(Key), *Value)
+
+  #---------------------------------------------------------------------------------------
+
+  def Stats(self):
+    """
+    Return cache counters.
+    """
+
+    return {'Hits': self.Hits,
+            'Misses': self.Misses,
+            'Size': len(self.Data)}
+
+  #---------------------------------------------------------------------------------------
+
+  def Clear(self, Disk=False):
+    """
+    Remove all results from memory (and optionally from disk).
+    """
+
+    self.Data.clear()
+    self.Hits = 0
+    self.Misses = 0
+
+    if Disk and self.Path:
+      for F in _os.listdir(self.Path):
+        if F.endswith('.npz'):
+          _os.remove(_os.path.join(self.Path, F))
+
+  #---------------------------------------------------------------------------------------
+
+  def _Store(self, Key, Value):
+
+    self.Data[Key] = Value
+
+    while len(self.Data) > self.Size:
+      self.Data.popitem(last=False)
+
+  def _File(self, Key):
+
+    return _os.path.join(self.Path, Key + '.npz')
+
+#-----------------------------------------------------------------------------------------
+
+def Enable(Size=1000, Path=''):
+  """
+  Enable the default cache used by the site computations.
+  """
+
+  global Default
+  Default = Cache(Size, Path)
+
+  return Default
+
+#-----------------------------------------------------------------------------------------
+
+def Disable():
+  """
+  Disable the default cache.
+  """
+
+  global Default
+  Default = None
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2010-2017 GEM Foundation
+#
+# The Site Response Toolkit (SRTK) is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# SRTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# with this download. If not, see <http://www.gnu.org/licenses/>
+#
+# Author: Poggi Valerio
+
+"""
+Equivalent-linear site response analysis, with strain-compatible
+shear modulus and damping iterated for stacks of soil profiles
+(and input motions) at once.
+"""
+
+import numpy as _np
+
+import SiteMethods as _SM
+
+#-----------------------------------------------------------------------------------------
+
+def ShStrainFunction(Hl, Vs, Dn, Qs, Freq, Iang=0.):
+  """
+  SH-wave transfer functions of displacement at the free surface and
+  of shear strain at the middle of each layer, both relative to the
+  outcrop displacement of the half-space. Wave amplitudes are those
+  of SiteMethods.ShTransferFunction (exp(-iwt) time convention).
+
+  Profiles are given as vectors of n layers or as stacks with
+  shape (nmodel, n). Output is a tuple of arrays with shape
+  (..., nfreq) and (..., n, nfreq); strain of the half-space is zero.
+  """
+
+  htf, A, B, Kz = _SM.ShTransferFunction(Hl, Vs, Dn, Qs, Freq, Iang, Layers=True)
+
+  hl = _np.array(Hl, dtype='float')[...,None]
+
+  # Strain at mid-layer (derivative of the layer displacement),
+  # normalised to the outcrop amplitude (twice the input)
+  with _np.errstate(over='ignore', invalid='ignore', under='ignore'):
+    Ph = _np.exp(1j*Kz*hl/2.)
+    gam = 0.5j*Kz*(A*Ph - B/Ph)
+
+  gam[...,-1,:] = 0.
+  gam[~_np.isfinite(gam)] = 0.
+
+  return htf[...,0], gam
+
+#-----------------------------------------------------------------------------------------
+
+def StrainHistory(Gtf, Disp, Nsmp):
+  """
+  Time histories of shear strain, from the strain transfer functions
+  (ShStrainFunction, shape (..., n, nfreq)) and the one-sided outcrop
+  displacement spectra (numpy rfft, shape (..., nfreq)).
+  Transfer functions are conjugated, as numpy uses the exp(+iwt)
+  time convention, to get causal responses.
+  """
+
+  return _np.fft.irfft(_np.conj(Gtf)*Disp[...,None,:], n=Nsmp, axis=-1)
+
+#-----------------------------------------------------------------------------------------
+
+def CurveInterp(Strain, Curve, Gam):
+  """
+  Interpolate strain-dependent curves (e.g. modulus reduction or
+  damping) at the given strain values, linearly in log-strain.
+  Values outside the strain axis are taken from the closest point.
+
+  Input parameters:
+    Strain = strain axis of the curves (nstrain)
+    Curve = curve values, shape (nstrain) or (..., nstrain)
+    Gam = strain values, shape (...)
+  """
+
+  lgs = _np.log10(_np.array(Strain, dtype='float'))
+  gam = _np.array(Gam, dtype='float')
+
+  with _np.errstate(divide='ignore'):
+    lgg = _np.log10(gam)
+
+  # Segment index and weight (common strain axis)
+  idx = _np.clip(_np.searchsorted(lgs, lgg), 1, lgs.size-1)
+  wgt = _np.clip((lgg - lgs[idx-1])/(lgs[idx] - lgs[idx-1]), 0., 1.)
+
+  crv = _np.broadcast_to(_np.array(Curve, dtype='float'), gam.shape + lgs.shape)
+  crv0 = _np.take_along_axis(crv, (idx-1)[...,None], axis=-1)[...,0]
+  crv1 = _np.take_along_axis(crv, idx[...,None], axis=-1)[...,0]
+
+  return crv0 + wgt*(crv1 - crv0)
+
+#-----------------------------------------------------------------------------------------
+
+def EqlSolver(Hl, Vs, Dn, Qs, Acc, Dt, Strain, GGmax, Damp,
+                                       Ratio=0.65,
+                                       Tol=0.02,
+                                       MaxIter=15,
+                                       Iang=0.,
+                                       ChunkSize=100):
+  """
+  Equivalent-linear analysis of a stack of soil profiles, each one
+  paired with an outcrop input motion. Shear-wave velocity and Q of
+  the soil layers are iterated until compatible with the effective
+  strain (Ratio times the peak strain); converged models are removed
+  from the computation. Half-space and zero-thickness (padding)
+  layers are kept linear.
+
+  Input parameters:
+    Hl, Vs, Dn, Qs = low-strain profiles, shape (nmodel, nlayer)
+    Acc = outcrop acceleration time histories, shape (nsample)
+          or (nmodel, nsample)
+    Dt = sampling interval (s)
+    Strain = strain axis of the curves (%)
+    GGmax = modulus reduction curves, shape (nstrain) or
+            (nmodel, nlayer, nstrain)
+    Damp = damping curves (%), same shape as GGmax
+    Ratio = effective to peak strain ratio
+    Tol = relative tolerance on modulus and damping
+    MaxIter = maximum number of iterations
+    ChunkSize = number of models processed together
+
+  Output:
+    Freq = frequency axis of the transfer functions (nfreq)
+    Tf = surface to outcrop transfer functions, (nmodel, nfreq),
+         same convention as SiteMethods.ShTransferFunction
+    VsE, QsE = strain-compatible profiles, (nmodel, nlayer)
+    Gam = effective strain of the layers (%), (nmodel, nlayer)
+    Iter = number of iterations of each model, (nmodel)
+  """
+
+  hl = _np.atleast_2d(_np.array(Hl, dtype='float'))
+  vs = _np.atleast_2d(_np.array(Vs, dtype='float'))
+  dn = _np.atleast_2d(_np.array(Dn, dtype='float'))
+  qs = _np.atleast_2d(_np.array(Qs, dtype='float'))
+  nmod, nlay = hl.shape
+
+  # Outcrop displacement spectra
+  acc = _np.atleast_2d(_np.array(Acc, dtype='float'))
+  nsmp = acc.shape[-1]
+  freq = _np.fft.rfftfreq(nsmp, Dt)
+
+  with _np.errstate(divide='ignore', invalid='ignore'):
+    disp = -_np.fft.rfft(acc, axis=-1)/((2.*_np.pi*freq)**2)
+  disp[...,0] = 0.
+  disp = _np.broadcast_to(disp, (nmod, freq.size))
+
+  # Curves of each layer
+  ggm = _np.broadcast_to(_np.array(GGmax, dtype='float'), (nmod, nlay, len(Strain)))
+  dmp = _np.broadcast_to(_np.array(Damp, dtype='float'), (nmod, nlay, len(Strain)))
+
+  # Layers with strain-dependent properties
+  soil = (hl > 0.) & (_np.arange(nlay) < nlay-1)
+
+  Tf = _np.zeros((nmod, freq.size), dtype='complex128')
+  VsE = vs.copy()
+  QsE = qs.copy()
+  Gam = _np.zeros((nmod, nlay))
+  Iter = _np.zeros(nmod, dtype='int')
+
+  for C in range(0, nmod, max(int(ChunkSize), 1)):
+
+    # Models still iterating
+    Act = _np.arange(C, min(C + int(ChunkSize), nmod))
+
+    for N in range(MaxIter):
+
+      htf, gtf = ShStrainFunction(hl[Act], VsE[Act], dn[Act], QsE[Act], freq, Iang)
+
+      # Effective strain (%) from peak of the strain time histories
+      gt = StrainHistory(gtf, disp[Act], nsmp)
+      gam = 100.*Ratio*_np.max(_np.abs(gt), axis=-1)
+
+      # Strain-compatible properties
+      GN = CurveInterp(Strain, ggm[Act], gam)
+      DN = _np.maximum(CurveInterp(Strain, dmp[Act], gam), 1e-4)
+
+      VsN = _np.where(soil[Act], vs[Act]*_np.sqrt(GN), vs[Act])
+      QsN = _np.where(soil[Act], 100./(2.*DN), qs[Act])
+
+      Err = _np.maximum(_np.abs((VsN/VsE[Act])**2 - 1.),
+                        _np.abs(QsE[Act]/QsN - 1.))
+      Err = _np.max(_np.where(soil[Act], Err, 0.), axis=-1)
+
+      Tf[Act] = htf
+      Gam[Act] = gam
+      VsE[Act] = VsN
+      QsE[Act] = QsN
+      Iter[Act] += 1
+
+      Act = Act[Err > Tol]
+
+      if not Act.size:
+        break
+
+  return freq, Tf, VsE, QsE, Gam, Iter
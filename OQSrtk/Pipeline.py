@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2010-2017 GEM Foundation
+#
+# The Site Response Toolkit (SRTK) is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# SRTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# with this download. If not, see <http://www.gnu.org/licenses/>
+#
+# Author: Poggi Valerio
+
+"""
+Streaming processing of large site lists with bounded memory.
+Sites are read from the index file in windows of fixed size,
+processed and written to an output sink before the next window
+is loaded.
+"""
+
+import SiteModel as _SMo
+import ProfileTools as _PT
+
+#-----------------------------------------------------------------------------------------
+
+def ReadSites(AsciiFile, Root='', FileType='',
+                         Header=['Id','X','Y','Z','File'],
+                         SkipLine=0,
+                         Window=100,
+                         Workers=1):
+  """
+  Generator of site databases (SiteDb) of at most Window sites,
+  read sequentially from a site list (see SiteDb.ImportSites).
+  """
+
+  Data = []
+
+  for D in _ReadIndex(AsciiFile, Header, SkipLine):
+    Data.append(D)
+
+    if len(Data) == Window:
+      yield _MakeDb(Data, Root, FileType, Workers)
+      Data = []
+
+  if Data:
+    yield _MakeDb(Data, Root, FileType, Workers)
+
+#-----------------------------------------------------------------------------------------
+
+def Run(AsciiFile, Sink, Steps=['Vz','Gc','Qwl','Imp','Stf','Res','K0','Att'],
+                         Root='',
+                         FileType='',
+                         Header=['Id','X','Y','Z','File'],
+                         SkipLine=0,
+                         Window=100,
+                         Freq=(0.1, 100., 1000, True),
+                         Z=[30.],
+                         Iang=0.,
+                         Elastic=False,
+                         Workers=1,
+                         Report=''):
+  """
+  Process all the sites of a site list in windows of Window sites.
+  Steps are the quantities to compute, in the given order:
+    'Vz'  - travel-time average velocities at depths Z
+    'Gc'  - geotechnical class (EC8)
+    'Qwl' - quarter-wavelength parameters
+    'Imp' - impedance amplification (needs 'Qwl')
+    'Stf' - SH-wave transfer function
+    'Res' - resonance frequencies (needs 'Stf')
+    'K0'  - Kappa0 of the whole profile
+    'Att' - attenuation function (needs 'K0')
+  Results are passed to the sink (any object with methods
+  Write(SiteDb) and Close()) at the end of each window; the
+  sink is closed at the end of the run, also on errors.
+  If a Report file is given, the run is instrumented (see
+  ProfileTools, unless already enabled) and a timing summary
+  is written at the end.
+  Output is the number of processed sites.
+  """
+
+  Own = bool(Report) and _PT.Stats is None
+  if Own:
+    _PT.Enable()
+
+  Num = 0
+
+  try:
+    for Db in ReadSites(AsciiFile, Root, FileType, Header, SkipLine, Window, Workers):
+
+      Db.FrequencyAxis(*Freq)
+
+      for Step in Steps:
+        if Step == 'Vz': Db.ComputeTTAV(Z=list(Z))
+        if Step == 'Gc': Db.ComputeGTClass()
+        if Step == 'Qwl': Db.ComputeQWL()
+        if Step == 'Imp': Db.ComputeImpAmp()
+        if Step == 'Stf': Db.ComputeSHTF(Iang, Elastic)
+        if Step == 'Res': Db.ComputeFnRes()
+        if Step == 'K0': Db.ComputeKappa()
+        if Step == 'Att': Db.ComputeAttFun()
+
+      Sink.Write(Db)
+      Num += Db.Size()
+
+    if Report:
+      _PT.Report(File=Report)
+
+  finally:
+    # Sink is closed and original functions restored, also on errors
+    try:
+      Sink.Close()
+    finally:
+      if Own:
+        _PT.Disable()
+
+  return Num
+
+#-----------------------------------------------------------------------------------------
+
+class CsvSink(object):
+  """
+  Sink writing scalar results of each site model into a csv file:
+  Id, X, Y, Z, model index, average velocities (Vz), class (Gc),
+  Kappa0 (K0), fundamental frequency and amplitude (F0, A0).
+  """
+
+  def __init__(self, CsvFile, Z=[30.], Delimiter=','):
+
+    self.Z = [float(z) for z in Z]
+    self.Delimiter = Delimiter
+
+    self.File = open(CsvFile, 'w')
+
+    Header = ['Id','X','Y','Z','Mod']
+    Header += ['Vz{0:g}'.format(z) for z in self.Z]
+    Header += ['Gc','K0','F0','A0']
+    self.File.write(Delimiter.join(Header) + '\n')
+
+  #---------------------------------------------------------------------------------------
+
+  def Write(self, Db):
+
+    for S in Db.Site:
+      for I, M in enumerate(S.Mod):
+
+        Row = [S.Hdr['Id'], S.Hdr['X'], S.Hdr['Y'], S.Hdr['Z'], I]
+        Row += [(M.Eng['Vz'] or {}).get(z, '') for z in self.Z]
+        Row += [M.Eng['Gc'], M.Eng['K0']]
+
+        if M.Amp['Res'] and len(M.Amp['Res']['Fn']):
+          Row += [M.Amp['Res']['Fn'][0], M.Amp['Res']['An'][0]]
+        else:
+          Row += ['', '']
+
+        Row = ['' if R == [] else str(R) for R in Row]
+        self.File.write(self.Delimiter.join(Row) + '\n')
+
+    self.File.flush()
+
+  #---------------------------------------------------------------------------------------
+
+  def Close(self):
+
+    self.File.close()
+
+#-----------------------------------------------------------------------------------------
+
+class DbSink(object):
+  """
+  Sink saving each window of sites, including all frequency-dependent
+  results, as a separate binary database file (see SiteDb.Save).
+  File names are built from a prefix and the window number.
+  """
+
+  def __init__(self, Prefix):
+
+    self.Prefix = Prefix
+    self.Files = []
+
+  #---------------------------------------------------------------------------------------
+
+  def Write(self, Db):
+
+    DbFile = '{0}_{1:05d}.bin'.format(self.Prefix, len(self.Files))
+    Db.Save(DbFile)
+
+    self.Files.append(DbFile)
+
+  #---------------------------------------------------------------------------------------
+
+  def Close(self):
+
+    return
+
+#-----------------------------------------------------------------------------------------
+
+def _ReadIndex(AsciiFile, Header, SkipLine, Delimiter=',', Comment='#'):
+  """
+  Private generator parsing the site list line by line.
+  """
+
+  with open(AsciiFile, 'r') as f:
+
+    for I in range(SkipLine):
+      f.readline()
+
+    for Line in f:
+
+      if not Line.strip() or Line[0] == Comment:
+        continue
+
+      Value = Line.strip().split(Delimiter)
+
+      D = {}
+      for H, V in zip(Header, Value):
+        if H in ['Id','File']:
+          D[H] = V
+        elif H != '':
+          D[H] = float(V) if V else []
+
+      yield D
+
+#-----------------------------------------------------------------------------------------
+
+def _MakeDb(Data, Root, FileType, Workers):
+  """
+  Private function to build a site database from index rows.
+  """
+
+  Db = _SMo.SiteDb()
+  Db.AddSites(Data, Root, FileType, Workers)
+
+  return Db
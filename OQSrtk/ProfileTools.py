@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2010-2017 GEM Foundation
+#
+# The Site Response Toolkit (SRTK) is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# SRTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# with this download. If not, see <http://www.gnu.org/licenses/>
+#
+# Author: Poggi Valerio
+
+"""
+Opt-in instrumentation of the site computations. When enabled,
+methods of Site1D and SiteDb (Compute*, Import*...), the kernels of
+SiteMethods and Utils.Round are wrapped to record wall time, call
+counts and problem sizes, per method and per site. Optional hooks
+collect a cProfile profile and tracemalloc memory peaks.
+Original functions are restored when disabled (no overhead).
+
+Example:
+  import ProfileTools as PT
+  PT.Enable(Profile=True)
+  Db.ComputeSHTF()
+  print PT.Report()
+  PT.Disable()
+
+Timings of computations run in worker processes (Workers > 1)
+are not collected.
+"""
+
+import time as _tm
+import types as _ty
+import weakref as _wr
+import threading as _th
+import functools as _ft
+import collections as _cl
+import cProfile as _cp
+import pstats as _ps
+
+try:
+  import StringIO as _io
+except ImportError:
+  import io as _io
+
+try:
+  import tracemalloc as _tr
+except ImportError:
+  _tr = None
+
+import SiteMethods as _SM
+import SiteModel as _SMo
+import Utils as _UT
+
+#-----------------------------------------------------------------------------------------
+
+# Active recorder (instrumentation disabled if None)
+Stats = None
+
+# Original functions of the instrumented objects
+_Orig = []
+
+# Instrumented methods (prefixes) and functions
+MethodPrefix = ['Compute', 'Import']
+MethodNames = ['AddSites', 'Pack', 'Save', 'Load']
+
+#-----------------------------------------------------------------------------------------
+
+class Recorder(object):
+  """
+  Collector of timing records.
+  Method: per method name, number of calls, total and maximum
+          wall time (s), number of models and frequencies processed
+          and memory peak (bytes, if traced).
+  Site: per site object (in order of first call), its Id and the
+        wall time of each method, excluding the time already
+        attributed by nested calls. Time of SiteDb calls (e.g.
+        batched computations) is shared by problem size (number
+        of models times frequencies) among the sites added by the
+        call, or else among all sites.
+  """
+
+  def __init__(self, Profile=False, Memory=False):
+
+    self.Method = _cl.OrderedDict()
+    self.Site = []
+
+    self.Profiler = _cp.Profile() if Profile else None
+    self.Memory = bool(Memory and _tr is not None)
+
+    # Call nesting is tracked separately for each thread
+    self.Local = _th.local()
+    self.Lock = _th.Lock()
+    self.Start = _tm.time()
+
+    # Position of each site in the Site list, by object
+    self._Index = {}
+
+  #---------------------------------------------------------------------------------------
+
+  def Thread(self):
+    """
+    State of the current thread: call depth, time attributed
+    to sites and skip level (see _Quiet).
+    """
+
+    L = self.Local
+
+    if not hasattr(L, 'Depth'):
+      L.Depth, L.Booked, L.Skip = 0, 0., 0
+
+    return L
+
+  #---------------------------------------------------------------------------------------
+
+  def Entry(self, Site):
+    """
+    Timing record of a site object (created at first use).
+    """
+
+    Ref, I = self._Index.get(id(Site), (None, None))
+
+    # Ids of collected objects can be reused
+    if Ref is None or Ref() is not Site:
+      I = len(self.Site)
+      self.Site.append({'Id': Site.Hdr['Id'], 'Time': {}})
+      self._Index[id(Site)] = (_wr.ref(Site), I)
+
+    self.Site[I]['Id'] = Site.Hdr['Id']
+
+    return self.Site[I]['Time']
+
+  #---------------------------------------------------------------------------------------
+
+  def Add(self, Name, Time, Size, Mem=None):
+    """
+    Add a call record.
+    """
+
+    with self.Lock:
+      R = self.Method.get(Name)
+
+      if R is None:
+        R = {'Calls': 0, 'Time': 0., 'Max': 0., 'Models': 0, 'Freqs': 0, 'Mem': None}
+        self.Method[Name] = R
+
+      R['Calls'] += 1
+      R['Time'] += Time
+      R['Max'] = max(R['Max'], Time)
+      R['Models'] += Size[0]
+      R['Freqs'] = max(R['Freqs'], Size[1])
+
+      if Mem is not None:
+        R['Mem'] = max(R['Mem'] or 0, Mem)
+
+  #---------------------------------------------------------------------------------------
+
+  def Share(self, Name, Time, Site):
+    """
+    Attribute the time of a call to a list of sites, in
+    proportion to their number of models and frequencies.
+    """
+
+    if not Site:
+      return
+
+    Size = [max(len(S.Mod), 1)*max(len(S.Freq), 1) for S in Site]
+    Total = float(sum(Size))
+
+    with self.Lock:
+      for S, N in zip(Site, Size):
+        T = self.Entry(S)
+        T[Name] = T.get(Name, 0.) + Time*N/Total
+
+    self.Thread().Booked += Time
+
+#-----------------------------------------------------------------------------------------
+
+def Enable(Profile=False, Memory=False):
+  """
+  Enable instrumentation, optionally with cProfile profiling
+  (Profile) and tracemalloc memory tracing (Memory, Python 3).
+  Output is the new recorder (see Recorder).
+  """
+
+  global Stats
+
+  Disable()
+
+  Targets = []
+
+  for Cls in [_SMo.Site1D, _SMo.SiteDb]:
+    for Name, Func in list(vars(Cls).items()):
+      if isinstance(Func, _ty.FunctionType) and \
+         (Name in MethodNames or any(Name.startswith(P) for P in MethodPrefix)):
+        Targets.append((Cls, Name, Cls.__name__ + '.' + Name))
+
+  for Name in dir(_SM):
+    if Name[0].isupper() and isinstance(getattr(_SM, Name), _ty.FunctionType):
+      Targets.append((_SM, Name, 'SiteMethods.' + Name))
+
+  Targets.append((_UT, 'Round', 'Utils.Round'))
+
+  for Owner, Name, Label in Targets:
+    Func = vars(Owner)[Name]
+    _Orig.append((Owner, Name, Func))
+    setattr(Owner, Name, _Wrap(Label, Func))
+
+  # Sites used only for parsing are not instrumented
+  _Orig.append((_SMo, '_ParseModel', _SMo._ParseModel))
+  _SMo._ParseModel = _Quiet(_SMo._ParseModel)
+
+  Stats = Recorder(Profile, Memory)
+
+  if Stats.Memory and not _tr.is_tracing():
+    _tr.start()
+
+  return Stats
+
+#-----------------------------------------------------------------------------------------
+
+def Disable():
+  """
+  Disable instrumentation and restore the original functions.
+  Output is the last recorder (or None).
+  """
+
+  global Stats
+
+  while _Orig:
+    Owner, Name, Func = _Orig.pop()
+    setattr(Owner, Name, Func)
+
+  Rec, Stats = Stats, None
+
+  if Rec is not None and Rec.Memory and _tr.is_tracing():
+    _tr.stop()
+
+  return Rec
+
+#-----------------------------------------------------------------------------------------
+
+def Report(Rec=None, Top=20, File=''):
+  """
+  Summary report of a recorder (default is the active one):
+  method timings, slowest sites and cProfile statistics.
+  The report is returned as text and optionally written to File.
+  """
+
+  Rec = Rec or Stats
+
+  if Rec is None:
+    return ''
+
+  Out = []
+  Out.append('Total elapsed time: {0:.3f} s'.format(_tm.time() - Rec.Start))
+  Out.append('')
+  Out.append('{0:<36} {1:>8} {2:>10} {3:>10} {4:>10} {5:>8} {6:>6} {7:>9}'.format(
+             'Method', 'Calls', 'Total(s)', 'Mean(s)', 'Max(s)',
+             'Models', 'Freqs', 'Mem(MB)'))
+
+  Meth = sorted(Rec.Method.items(), key=lambda M: -M[1]['Time'])
+
+  for Name, R in Meth:
+    Out.append('{0:<36} {1:>8} {2:>10.4f} {3:>10.6f} {4:>10.4f} {5:>8} {6:>6} {7:>9}'.format(
+               Name, R['Calls'], R['Time'], R['Time']/R['Calls'], R['Max'],
+               R['Models'], R['Freqs'],
+               '-' if R['Mem'] is None else '{0:.2f}'.format(R['Mem']/2.**20)))
+
+  if Rec.Site:
+    Out.append('')
+    Out.append('Slowest sites (exclusive time, database calls shared by problem size):')
+
+    Site = sorted(enumerate(Rec.Site), key=lambda S: -sum(S[1]['Time'].values()))
+
+    for I, S in Site[:Top]:
+      Main = max(S['Time'].items(), key=lambda M: M[1])
+      Out.append('  {0:<20} {1:>10.4f} s  (mostly {2}: {3:.4f} s)'.format(
+                 '#{0} {1}'.format(I, S['Id'] if S['Id'] != [] else '-'),
+                 sum(S['Time'].values()), Main[0], Main[1]))
+
+  if Rec.Profiler is not None:
+    Buf = _io.StringIO()
+    _ps.Stats(Rec.Profiler, stream=Buf).sort_stats('cumulative').print_stats(Top)
+    Out.append('')
+    Out.append(Buf.getvalue())
+
+  Text = '\n'.join(Out)
+
+  if File:
+    with open(File, 'w') as f:
+      f.write(Text + '\n')
+
+  return Text
+
+#-----------------------------------------------------------------------------------------
+
+def _Wrap(Label, Func):
+  """
+  Private function to build the instrumented version of a function.
+  """
+
+  @_ft.wraps(Func)
+  def Wrapper(*Args, **Kw):
+
+    Rec = Stats
+
+    if Rec is None or Rec.Thread().Skip:
+      return Func(*Args, **Kw)
+
+    Obj = Args[0] if Args else None
+    Loc = Rec.Thread()
+    Outer = (Loc.Depth == 0)
+
+    if Outer:
+      if Rec.Profiler is not None:
+        Rec.Profiler.enable()
+      if Rec.Memory:
+        if hasattr(_tr, 'reset_peak'):
+          _tr.reset_peak()
+        M0 = _tr.get_traced_memory()[0]
+
+    # Sites before a database call
+    if isinstance(Obj, _SMo.SiteDb):
+      Old = set(id(S) for S in Obj.Site)
+
+    Loc.Depth += 1
+    B0 = Loc.Booked
+    T0 = _tm.time()
+
+    try:
+      return Func(*Args, **Kw)
+
+    finally:
+      Dt = _tm.time() - T0
+      Loc.Depth -= 1
+
+      Mem = None
+      if Outer:
+        if Rec.Profiler is not None:
+          Rec.Profiler.disable()
+        if Rec.Memory:
+          Mem = _tr.get_traced_memory()[1] - M0
+
+      Rec.Add(Label, Dt, _Size(Obj, Args), Mem)
+
+      # Time not attributed by nested calls
+      Own = Dt - (Loc.Booked - B0)
+
+      if isinstance(Obj, _SMo.Site1D):
+        Rec.Share(Label, Own, [Obj])
+
+      if isinstance(Obj, _SMo.SiteDb):
+        New = [S for S in Obj.Site if id(S) not in Old]
+        Rec.Share(Label, Own, New or Obj.Site)
+
+  return Wrapper
+
+#-----------------------------------------------------------------------------------------
+
+def _Quiet(Func):
+  """
+  Private function to build a version of a function whose
+  internal calls are not instrumented (in the calling thread).
+  """
+
+  @_ft.wraps(Func)
+  def Wrapper(*Args, **Kw):
+
+    Rec = Stats
+
+    if Rec is None:
+      return Func(*Args, **Kw)
+
+    Loc = Rec.Thread()
+    Loc.Skip += 1
+
+    try:
+      return Func(*Args, **Kw)
+
+    finally:
+      Loc.Skip -= 1
+
+  return Wrapper
+
+#-----------------------------------------------------------------------------------------
+
+def _Size(Obj, Args):
+  """
+  Private function to get the problem size of a call
+  (number of models and frequencies).
+  """
+
+  if isinstance(Obj, _SMo.Site1D):
+    return (len(Obj.Mod), len(Obj.Freq))
+
+  if isinstance(Obj, _SMo.SiteDb):
+    return (sum(len(S.Mod) for S in Obj.Site),
+            max([len(S.Freq) for S in Obj.Site] + [0]))
+
+  # Kernels: leading dimension of the first array argument
+  Shape = getattr(Obj, 'shape', ())
+
+  return (Shape[0] if len(Shape) > 1 else 1, 0)
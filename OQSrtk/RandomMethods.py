@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2010-2017 GEM Foundation
+#
+# The Site Response Toolkit (SRTK) is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# SRTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# with this download. If not, see <http://www.gnu.org/licenses/>
+#
+# Author: Poggi Valerio
+
+"""
+Randomisation of soil profiles (Toro, 1995). Realisations are
+generated directly as packed arrays of shape (nmodel, nlayer),
+which can be used with the vectorized functions of SiteMethods.
+"""
+
+import numpy as _np
+
+#-----------------------------------------------------------------------------------------
+
+def RandomProfiles(Hl, Vs, Dn, Qs, Num, Seed=None,
+                                        Layering=True,
+                                        Sigma=0.3,
+                                        SigmaDn=0.05,
+                                        SigmaQs=0.2,
+                                        Corr=(0.96, 13.1, 0.96, 0., 0.095),
+                                        Toro=(10.86, 0.89, 1.98),
+                                        Trunc=2.):
+  """
+  Generate random realisations of a base soil profile.
+
+  Layer interfaces follow a non-homogeneous Poisson process
+  with depth-dependent rate C3*(z+C1)^(-C2) (Toro parameters).
+  Vs is lognormal, with inter-layer correlation depending on
+  depth and layer separation (Corr = Rho0, Delta, Rho200, Z0, B).
+  Density and Q are lognormal and uncorrelated. Normal variates
+  are truncated at Trunc standard deviations.
+  The half-space is not randomised. Realisations with fewer
+  layers are padded with zero-thickness half-space layers
+  (see SiteMethods.PackProfiles).
+
+  Input parameters:
+    Hl, Vs, Dn, Qs = base profile (vectors of n layers)
+    Num = number of realisations
+    Seed = seed of the random generator (int or list of int)
+    Layering = randomise layer thickness (otherwise base layering)
+    Sigma, SigmaDn, SigmaQs = log-standard deviations
+
+  Output:
+    tuple of 2D arrays (Hl, Vs, Dn, Qs) of shape (Num, nlayer)
+  """
+
+  hl = _np.array(Hl, dtype='float')
+  vs = _np.array(Vs, dtype='float')
+  dn = _np.array(Dn, dtype='float')
+  qs = _np.array(Qs, dtype='float')
+
+  rng = _np.random.RandomState(Seed)
+
+  # Depth of the base layer interfaces (top of half-space last)
+  zb = _np.cumsum(hl[:-1])
+
+  if Layering and zb.size:
+
+    C1, C2, C3 = Toro
+    E = 1. - C2
+
+    # Expected number of interfaces (cumulative rate at half-space)
+    Lmax = C3/E*((zb[-1] + C1)**E - C1**E)
+    K = int(_np.ceil(Lmax + 6.*_np.sqrt(Lmax) + 5.))
+
+    # Interfaces from a unit-rate process (inverse transformation)
+    Lam = _np.cumsum(rng.exponential(size=(Num, K)), axis=1)
+    Zi = _np.minimum((Lam*E/C3 + C1**E)**(1./E) - C1, zb[-1])
+
+    Zn = _np.zeros((Num, K+2))
+    Zn[:,1:-1] = Zi
+    Zn[:,-1] = zb[-1]
+
+    # Half-space has zero thickness
+    H = _np.zeros((Num, K+2))
+    H[:,:-1] = _np.diff(Zn, axis=1)
+
+    # Base layer at mid-depth (padding gets half-space properties)
+    Zm = Zn[:,:-1] + H[:,:-1]/2.
+    Idx = _np.full(H.shape, hl.size-1, dtype='int')
+    Idx[:,:-1] = _np.searchsorted(zb, Zm, side='right')
+    Idx[H == 0.] = hl.size-1
+
+  else:
+    H = _np.tile(hl, (Num, 1))
+    Zn = _np.zeros(H.shape)
+    Zn[:,1:] = zb
+    Idx = _np.tile(_np.arange(hl.size), (Num, 1))
+
+  # Soil layers (half-space and padding are not randomised)
+  Soil = (_np.arange(H.shape[1]) < H.shape[1]-1) & (H > 0.)
+
+  # Correlated Vs variates (first-order auto-regressive in depth)
+  Zm = Zn + H/2.
+  Rho0, Delta, Rho200, Z0, B = Corr
+
+  Eps = _np.clip(rng.standard_normal(H.shape), -Trunc, Trunc)
+
+  for J in range(1, H.shape[1]):
+    Zd = _np.minimum(Zm[:,J], 200.)
+    Rd = Rho200*((Zd + Z0)/(200. + Z0))**B
+    Rt = Rho0*_np.exp(-(Zm[:,J] - Zm[:,J-1])/Delta)
+    Rho = (1. - Rd)*Rt + Rd
+
+    Eps[:,J] = _np.clip(Rho*Eps[:,J-1] + _np.sqrt(1. - Rho**2)*Eps[:,J], -Trunc, Trunc)
+
+  Dv = _np.clip(rng.standard_normal(H.shape), -Trunc, Trunc)
+  Qv = _np.clip(rng.standard_normal(H.shape), -Trunc, Trunc)
+
+  V = vs[Idx]*_np.where(Soil, _np.exp(Sigma*Eps), 1.)
+  D = dn[Idx]*_np.where(Soil, _np.exp(SigmaDn*Dv), 1.)
+  Q = qs[Idx]*_np.where(Soil, _np.exp(SigmaQs*Qv), 1.)
+
+  return H, V, D, Q
+
+#-----------------------------------------------------------------------------------------
+
+def RandomChunks(Hl, Vs, Dn, Qs, Num, ChunkSize=1000, Seed=None, **Kw):
+  """
+  Generator of random realisations of a base profile in chunks
+  of at most ChunkSize profiles (see RandomProfiles), to bound
+  memory use. Each chunk has its own seed derived from Seed,
+  so results are reproducible for a given chunk size.
+  """
+
+  if Seed is None:
+    Seed = _np.random.randint(2**31-1)
+
+  ChunkSize = max(int(ChunkSize), 1)
+
+  for I, C in enumerate(range(0, Num, ChunkSize)):
+    yield RandomProfiles(Hl, Vs, Dn, Qs, min(ChunkSize, Num-C),
+                         list(_np.atleast_1d(Seed)) + [I], **Kw)
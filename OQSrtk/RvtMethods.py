@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2010-2017 GEM Foundation
+#
+# The Site Response Toolkit (SRTK) is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# SRTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# with this download. If not, see <http://www.gnu.org/licenses/>
+#
+# Author: Poggi Valerio
+
+"""
+Collection of functions for random vibration theory (RVT)
+estimation of response spectra and response spectral amplification
+"""
+
+import numpy as _np
+
+#-----------------------------------------------------------------------------------------
+
+def BruneSpectrum(Freq, Mw, Stress=50., Dist=10., Kappa=0.03, Rho=2.8, Beta=3.7):
+  """
+  Fourier amplitude spectrum of acceleration (cm/s) from a
+  single-corner (Brune) point-source stochastic model, with
+  simple geometrical spreading (1/R) and Kappa attenuation.
+
+  Input parameters:
+    Freq = vector of frequencies (Hz)
+    Mw = moment magnitude
+    Stress = stress parameter (bar)
+    Dist = source distance (km)
+    Kappa = high-frequency attenuation parameter (s)
+    Rho = density at the source (g/cm3)
+    Beta = shear-wave velocity at the source (km/s)
+  """
+
+  Freq = _np.array(Freq, dtype='float')
+
+  # Seismic moment (dyne-cm) and corner frequency (Hz)
+  M0 = 10.**(1.5*Mw + 16.05)
+  Fc = 4.906e6*Beta*(Stress/M0)**(1./3.)
+
+  # Radiation pattern, free surface, partition onto two components
+  C = (0.55*2.*0.707)/(4.*_np.pi*Rho*(Beta**3.))*1e-20
+
+  Src = C*M0*((2.*_np.pi*Freq)**2.)/(1. + (Freq/Fc)**2.)
+  Att = _np.exp(-_np.pi*Kappa*Freq)/Dist
+
+  return Src*Att
+
+#-----------------------------------------------------------------------------------------
+
+def SourceDuration(Mw, Stress=50., Dist=10., Beta=3.7):
+  """
+  Ground-motion duration (s) of the point-source model:
+  source duration (1/Fc) plus a distance-dependent term.
+  """
+
+  M0 = 10.**(1.5*Mw + 16.05)
+  Fc = 4.906e6*Beta*(Stress/M0)**(1./3.)
+
+  return 1./Fc + 0.05*Dist
+
+#-----------------------------------------------------------------------------------------
+
+def OscillatorResponse(Freq, Periods, Damping=0.05):
+  """
+  Amplitude of the transfer function of single-degree-of-freedom
+  oscillators (pseudo-spectral acceleration from acceleration).
+  Output has shape (nperiod, nfreq).
+  """
+
+  Freq = _np.array(Freq, dtype='float')[None,:]
+  Fn = 1./_np.array(Periods, dtype='float')[:,None]
+
+  Resp = (Fn**2.)/_np.sqrt((Fn**2. - Freq**2.)**2. + (2.*Damping*Fn*Freq)**2.)
+
+  return Resp
+
+#-----------------------------------------------------------------------------------------
+
+def SpectralMoments(Freq, Fas, Order=[0,2,4]):
+  """
+  Spectral moments of a (one-sided) Fourier amplitude spectrum,
+  computed along the last axis.
+  """
+
+  Freq = _np.array(Freq, dtype='float')
+  Pow = _np.abs(Fas)**2.
+
+  Mom = [2.*_np.trapz(((2.*_np.pi*Freq)**K)*Pow, Freq, axis=-1) for K in Order]
+
+  return tuple(Mom)
+
+#-----------------------------------------------------------------------------------------
+
+def PeakFactor(M0, M2, M4, Duration, Znum=200, Zmax=8.):
+  """
+  Peak factor of Cartwright and Longuet-Higgins (1956).
+  The integral is solved for all input moments at once,
+  using a trapezoidal rule on a fixed grid.
+  """
+
+  M0 = _np.array(M0, dtype='float')
+  M2 = _np.array(M2, dtype='float')
+  M4 = _np.array(M4, dtype='float')
+
+  # Number of extrema and bandwidth parameter
+  Ne = _np.sqrt(M4/M2)*Duration/_np.pi
+  Nz = _np.sqrt(M2/M0)*Duration/_np.pi
+  Xi = _np.minimum(Nz/Ne, 1.)
+  Ne = _np.maximum(Ne, 1.)
+
+  Z = _np.linspace(0., Zmax, Znum)
+  Dz = Z[1] - Z[0]
+
+  Pf = _np.zeros(M0.shape)
+
+  for I, Zi in enumerate(Z):
+    Fz = 1. - _np.exp(Ne*_np.log1p(-Xi*_np.exp(-Zi**2.)))
+    Pf += Fz*(0.5 if I in [0, Znum-1] else 1.)
+
+  return _np.sqrt(2.)*Pf*Dz
+
+#-----------------------------------------------------------------------------------------
+
+def ResponseSpectrum(Freq, Fas, Periods, Duration, Damping=0.05):
+  """
+  Response spectrum (pseudo-acceleration) from a Fourier amplitude
+  spectrum of acceleration using random vibration theory.
+  The rms duration includes the oscillator correction of
+  Boore and Joyner (1984).
+
+  Input parameters:
+    Freq = vector of nfreq frequencies (Hz)
+    Fas = Fourier amplitude spectrum, shape (..., nfreq)
+    Periods = vector of nperiod oscillator periods (s)
+    Duration = ground-motion duration (s)
+    Damping = oscillator damping (fraction of critical)
+
+  Output:
+    Rs = response spectrum, shape (..., nperiod)
+  """
+
+  Fas = _np.array(Fas)
+  Periods = _np.array(Periods, dtype='float')
+
+  # Oscillator response spectrum (..., nperiod, nfreq)
+  Osc = OscillatorResponse(Freq, Periods, Damping)
+  M0, M2, M4 = SpectralMoments(Freq, Fas[...,None,:]*Osc)
+
+  # Root-mean-square duration
+  Gam = Duration/Periods
+  Dosc = Periods/(2.*_np.pi*Damping)
+  Drms = Duration + Dosc*((Gam**3.)/(Gam**3. + 1./3.))
+
+  Pf = PeakFactor(M0, M2, M4, Duration)
+
+  return Pf*_np.sqrt(M0/Drms)
+
+#-----------------------------------------------------------------------------------------
+
+def RvtAmplification(Freq, Fas, Amp, Periods, Duration, Damping=0.05):
+  """
+  Response spectral amplification of site amplification functions
+  (e.g. SH-wave transfer functions), as the ratio between the RVT
+  response spectra of the amplified and of the reference Fourier
+  spectrum.
+
+  Input parameters:
+    Freq = vector of nfreq frequencies (Hz)
+    Fas = reference Fourier amplitude spectrum (nfreq)
+    Amp = amplification functions, shape (..., nfreq)
+    Periods = vector of nperiod oscillator periods (s)
+    Duration = ground-motion duration (s)
+    Damping = oscillator damping (fraction of critical)
+
+  Output:
+    Ra = response spectral amplification, shape (..., nperiod)
+  """
+
+  Fas = _np.abs(_np.array(Fas))
+  Amp = _np.abs(_np.array(Amp))
+
+  RsRef = ResponseSpectrum(Freq, Fas, Periods, Duration, Damping)
+  RsAmp = ResponseSpectrum(Freq, Fas*Amp, Periods, Duration, Damping)
+
+  return RsAmp/RsRef
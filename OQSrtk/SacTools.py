@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2010-2017 GEM Foundation
+#
+# The Site Response Toolkit (SRTK) is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# SRTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# with this download. If not, see <http://www.gnu.org/licenses/>
+#
+# Author: Poggi Valerio
+
+"""
+Reader and writer of binary SAC files (header version 6).
+The 632-byte header is parsed as a structured array and the
+samples are accessed as a (read-only) memory-mapped float32 array,
+without copies. Byte order is detected from the header version.
+"""
+
+import numpy as _np
+
+#-----------------------------------------------------------------------------------------
+
+# Header fields, in file order
+HeadFloat = ['DELTA', 'DEPMIN', 'DEPMAX', 'SCALE', 'ODELTA',
+             'B', 'E', 'O', 'A', 'INTERNAL0'] + \
+            ['T{0}'.format(I) for I in range(10)] + \
+            ['F'] + \
+            ['RESP{0}'.format(I) for I in range(10)] + \
+            ['STLA', 'STLO', 'STEL', 'STDP',
+             'EVLA', 'EVLO', 'EVEL', 'EVDP', 'MAG'] + \
+            ['USER{0}'.format(I) for I in range(10)] + \
+            ['DIST', 'AZ', 'BAZ', 'GCARC', 'INTERNAL1', 'INTERNAL2',
+             'DEPMEN', 'CMPAZ', 'CMPINC',
+             'XMINIMUM', 'XMAXIMUM', 'YMINIMUM', 'YMAXIMUM'] + \
+            ['UNUSED{0}'.format(I) for I in range(7)]
+
+HeadInt = ['NZYEAR', 'NZJDAY', 'NZHOUR', 'NZMIN', 'NZSEC', 'NZMSEC',
+           'NVHDR', 'NORID', 'NEVID', 'NPTS', 'INTERNAL3', 'NWFID',
+           'NXSIZE', 'NYSIZE', 'UNUSED7', 'IFTYPE', 'IDEP', 'IZTYPE',
+           'UNUSED8', 'IINST', 'ISTREG', 'IEVREG', 'IEVTYP', 'IQUAL',
+           'ISYNTH', 'IMAGTYP', 'IMAGSRC'] + \
+          ['UNUSED{0}'.format(I) for I in range(9, 17)] + \
+          ['LEVEN', 'LPSPOL', 'LOVROK', 'LCALDA', 'UNUSED17']
+
+HeadChar = ['KSTNM', 'KEVNM', 'KHOLE', 'KO', 'KA'] + \
+           ['KT{0}'.format(I) for I in range(10)] + \
+           ['KF', 'KUSER0', 'KUSER1', 'KUSER2',
+            'KCMPNM', 'KNETWK', 'KDATRD', 'KINST']
+
+# Undefined values
+Undef = {'f': -12345., 'i': -12345, 'S': '-12345'}
+
+# Header size (bytes)
+HeadSize = 632
+
+#-----------------------------------------------------------------------------------------
+
+def HeadDtype(ByteOrder='<'):
+  """
+  Structured data type of the SAC header.
+  """
+
+  Fields = [(K, ByteOrder + 'f4') for K in HeadFloat] + \
+           [(K, ByteOrder + 'i4') for K in HeadInt] + \
+           [(K, 'S16' if K == 'KEVNM' else 'S8') for K in HeadChar]
+
+  return _np.dtype(Fields)
+
+#-----------------------------------------------------------------------------------------
+
+def ByteOrder(Buffer):
+  """
+  Byte order ('<' or '>') of a SAC header, from the header
+  version number (NVHDR = 6).
+  """
+
+  Off = 4*len(HeadFloat) + 4*HeadInt.index('NVHDR')
+
+  for Bo in ['<', '>']:
+    if _np.frombuffer(Buffer, dtype=Bo + 'i4', count=1, offset=Off)[0] == 6:
+      return Bo
+
+  raise ValueError('Not a SAC file (or unsupported header version)')
+
+#-----------------------------------------------------------------------------------------
+
+def ReadHeader(SacFile):
+  """
+  Read the header of a SAC file.
+  Output is a tuple (header dictionary, byte order).
+  Undefined fields are not included.
+  """
+
+  with open(SacFile, 'rb') as f:
+    Buffer = f.read(HeadSize)
+
+  if len(Buffer) < HeadSize:
+    raise ValueError('Not a SAC file: {0}'.format(SacFile))
+
+  Bo = ByteOrder(Buffer)
+  Head = _np.frombuffer(Buffer, dtype=HeadDtype(Bo), count=1)[0]
+
+  return _HeadDict(Head), Bo
+
+#-----------------------------------------------------------------------------------------
+
+class Sac(object):
+  """
+  SAC file.
+    Head - Header fields (dictionary, defined values only)
+    Data - Samples of each data block (list of arrays); time
+           series have one block, uneven or spectral data two
+  """
+
+  def __init__(self, SacFile=None, Memmap=True):
+
+    self.Head = {}
+    self.Data = []
+
+    if SacFile:
+      self.Read(SacFile, Memmap)
+
+  #---------------------------------------------------------------------------------------
+
+  def Read(self, SacFile, Memmap=True):
+    """
+    Read a SAC file. With Memmap, samples are read-only
+    memory-mapped views of the file.
+    """
+
+    self.Head, Bo = ReadHeader(SacFile)
+
+    NPTS = self.Head['NPTS']
+    Dt = _np.dtype(Bo + 'f4')
+
+    # Second block for uneven or non time-series data
+    NBLK = 1 if self.Head.get('LEVEN', 1) and self.Head.get('IFTYPE', 1) == 1 else 2
+
+    if Memmap and NPTS:
+      Data = _np.memmap(SacFile, dtype=Dt, mode='r',
+                        offset=HeadSize, shape=(NBLK, NPTS))
+    else:
+      with open(SacFile, 'rb') as f:
+        f.seek(HeadSize)
+        Data = _np.fromfile(f, dtype=Dt, count=NBLK*NPTS).reshape(NBLK, NPTS)
+
+    self.Data = list(Data)
+
+  #---------------------------------------------------------------------------------------
+
+  def Write(self, SacFile, ByteOrder='<'):
+    """
+    Write a SAC file. Number of samples, amplitude statistics
+    and end time are updated from the data.
+    """
+
+    Data = [_np.asarray(D, dtype='float32') for D in self.Data]
+
+    Head = dict(self.Head)
+    Head['NPTS'] = Data[0].size if Data else 0
+    Head['NVHDR'] = 6
+    Head.setdefault('IFTYPE', 1)
+    Head.setdefault('LEVEN', 1)
+    Head.setdefault('B', 0.)
+
+    if Data and Data[0].size:
+      Head['DEPMIN'] = float(Data[0].min())
+      Head['DEPMAX'] = float(Data[0].max())
+      Head['DEPMEN'] = float(Data[0].mean())
+
+      if Head['LEVEN'] and 'DELTA' in Head:
+        Head['E'] = Head['B'] + (Head['NPTS'] - 1)*Head['DELTA']
+
+    Bo = ByteOrder
+    Out = _np.zeros(1, dtype=HeadDtype(Bo))
+
+    for K in Out.dtype.names:
+      Val = Head.get(K, Undef[Out.dtype[K].kind])
+      if Out.dtype[K].kind == 'S':
+        Val = str(Val).ljust(Out.dtype[K].itemsize)
+      Out[K] = Val
+
+    with open(SacFile, 'wb') as f:
+      f.write(Out.tobytes())
+      for D in Data:
+        f.write(D.astype(Bo + 'f4').tobytes())
+
+#-----------------------------------------------------------------------------------------
+
+def _HeadDict(Head):
+  """
+  Private function to convert a structured header to a
+  dictionary of the defined fields (strings are stripped
+  native strings).
+  """
+
+  Out = {}
+
+  for K in Head.dtype.names:
+    Val = Head[K]
+
+    if Head.dtype[K].kind == 'S':
+      Val = Val.split(b'\x00')[0].strip()
+      if not isinstance(Val, str):
+        Val = Val.decode('ascii', 'replace')
+      if Val and Val != Undef['S']:
+        Out[K] = Val
+
+    elif Val != Undef[Head.dtype[K].kind]:
+      Out[K] = Val.item()
+
+  return Out
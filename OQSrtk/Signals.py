@@ -17,10 +17,33 @@
 #
 # Author: Poggi Valerio
 
+import os as _os
+import glob as _gl
+import datetime as _dt
+import collections as _cl
+import multiprocessing.pool as _mpp
+
 import numpy as _np
 import scipy.signal as _sig
+import scipy.fftpack as _fft
+
+import SacTools as _ST
+
+#-----------------------------------------------------------------------------------------
+
+# Maximum number of entries of each cache (least recently
+# used entries are discarded first)
+_CacheSize = 32
+
+# Butterworth designs (second-order sections), by
+# (order, low corner, high corner, sampling rate)
+_SosCache = _cl.OrderedDict()
+
+# Taper windows, by (length, type, parameter)
+_WinCache = _cl.OrderedDict()
 
-import SacLib as _SL
+# Window types taking a shape parameter (Alpha)
+_WinParam = ['tukey', 'kaiser', 'gaussian', 'exponential', 'chebwin']
 
 #-----------------------------------------------------------------------------------------
 
@@ -44,7 +67,8 @@ class Record():
       CHNID - Channel ID (one name for each channel)
       UNITS - Units in S.I. or description (e.g. 'Acceleration')
 
-    CHN - Recording list (one array per channel), floats
+    CHN - Recordings, 2D array of shape (nchn, nsmp), floats
+    FSP - One-sided spectra, 2D array of shape (nchn, nfreq), complex
     TAX - Time axis of the recording (Optional), floats
     FAX - Frequency axis of the spectrum (Optional), floats
     """
@@ -60,61 +84,119 @@ class Record():
                 'STAID': '',
                 'RECID': '',
                 'EVEID': '',
-                'CHNID': '',
+                'CHNID': [],
                 'UNITS': ''}
 
     self.TAX = []
     self.FAX = []
-    self.CHN = []
-    self.FSP = []
+    self.CHN = _np.zeros((0,0))
+    self.FSP = _np.zeros((0,0), dtype='complex')
+
+    self._FaxKey = None
 
   #---------------------------------------------------------------------------------------
 
   def ImportSac(self, SacFile):
     """
+    Import a SAC file as a new channel. Header information
+    (sampling, start time, station) is taken from the first file.
+    """
+
+    self.AddSac(_ST.Sac(SacFile))
+
+  #---------------------------------------------------------------------------------------
+
+  def AddSac(self, S):
+    """
+    Add a SAC trace (SacTools.Sac) as a new channel.
     """
 
-    S = _SL.Sac(SacFile)
+    H = S.Head
+
+    if not self.HDR['NCHN']:
+      self.HDR['TSMP'] = H['DELTA']
+
+      T = _SacTime(H)
+      if T is not None:
+        self.HDR['TREF'] = [T.year, T.month, T.day, T.hour, T.minute,
+                            T.second + T.microsecond*1e-6]
+
+      self.HDR['SCRD'] = [H.get('STLO', 0.), H.get('STLA', 0.), H.get('STEL', 0.)]
+
+      self.INF['NETID'] = H.get('KNETWK', '')
+      self.INF['STAID'] = H.get('KSTNM', '')
+      self.INF['EVEID'] = H.get('KEVNM', '')
+
+    self.AddChannel(S.Data[0])
+    self.INF['CHNID'].append(H.get('KCMPNM', ''))
+
+  #---------------------------------------------------------------------------------------
+
+  def AddChannel(self, Data):
+    """
+    Append a channel (or a block of channels, shape (nchn, nsmp))
+    to the recording. All channels must have the same number
+    of samples.
+    """
+
+    Data = _np.atleast_2d(_np.array(Data, dtype='float'))
+    NSMP = Data.shape[1]
+
+    if self.HDR['NCHN'] and NSMP != self.CHN.shape[1]:
+      raise ValueError('Channel length {0} does not match record '
+                       'length {1}'.format(NSMP, self.CHN.shape[1]))
 
-    self.HDR['NSMP'] = S.Head['NPTS']
-    self.HDR['TSMP'] = S.Head['DELTA']
-    self.HDR['NCHN'] += 1
+    self.CHN = _np.vstack((self.CHN.reshape(-1, NSMP), Data))
 
-    self.CHN.append(_np.array(S.Data[0]))
+    self.HDR['NSMP'] = NSMP
+    self.HDR['NCHN'] = self.CHN.shape[0]
 
   #---------------------------------------------------------------------------------------
 
   def Fourier(self, Inverse=False):
     """
-    FFT
+    FFT of all channels at once (one-sided, real input).
+    Records are zero-padded to a fast FFT length; the inverse
+    transform restores the original number of samples.
     """
 
+    NSMP = int(self.HDR['NSMP'])
+    NFFT = _fft.next_fast_len(NSMP)
+
     if Inverse:
-      self.CHN = []
-      for S in self.FSP:
-        self.CHN.append(_np.fft.ifft(S).real)
+      self.CHN = _np.fft.irfft(self.FSP, n=NFFT, axis=-1)[:,:NSMP]
     else:
-      self.FSP = []
-      for S in self.CHN:
-        self.FSP.append(_np.fft.fft(S))
+      self.FSP = _np.fft.rfft(self.CHN, n=NFFT, axis=-1)
+
+      # Frequency axis (recomputed only if sampling changes)
+      if self._FaxKey != (NFFT, self.HDR['TSMP']):
+        self.FAX = _np.fft.rfftfreq(NFFT, self.HDR['TSMP'])
+        self._FaxKey = (NFFT, self.HDR['TSMP'])
 
   #---------------------------------------------------------------------------------------
 
-  def Taper(self, Alpha):
+  def Taper(self, Alpha, Window='tukey'):
     """
-    Tukey window tapering
+    Window tapering (default Tukey) of all channels.
+    Alpha is the shape parameter of the window, if any
+    (see scipy.signal.get_window for the available types).
     """
 
-    Win = _sig.tukey(self.HDR['NSMP'], alpha=Alpha)
+    Win = _TaperWindow(int(self.HDR['NSMP']), Window, Alpha)
 
-    for I,S in enumerate(self.CHN):
-      self.CHN[I] *= Win
+    self.CHN = self.CHN*Win
 
   #---------------------------------------------------------------------------------------
 
-  def Filter(self, LowCorner, HighCorner, Order=3):
+  def Filter(self, LowCorner, HighCorner, Order=3, ZeroPhase=False, Domain='time'):
     """
-    Butterworth bandpass filter
+    Butterworth bandpass filter (lowpass if LowCorner is 0).
+    All channels are filtered at once using second-order sections.
+
+    Input parameters:
+      ZeroPhase = forward-backward filtering (no phase shift)
+      Domain = 'time' (recursive filtering) or 'freq' (spectral
+               multiplication, faster for very long records)
     """
 
     FS = 1./self.HDR['TSMP']
@@ -127,17 +209,134 @@ class Record():
       print 'Warning: Low corner must be > 0 Hz'.format(FS/2.)
       return
 
-    # Corner frequencies
-    Corners = [2.*LowCorner/FS, 2.*HighCorner/FS]
+    Sos = _ButterSos(Order, LowCorner, HighCorner, FS)
+
+    if Domain == 'freq':
+      self.CHN = _FreqFilter(Sos, self.CHN, ZeroPhase)
+
+    elif ZeroPhase:
+      self.CHN = _sig.sosfiltfilt(Sos, self.CHN, axis=-1)
+
+    else:
+      zi = _sig.sosfilt_zi(Sos)[:,None,:]*self.CHN[None,:,:1]
+      self.CHN,_ = _sig.sosfilt(Sos, self.CHN, axis=-1, zi=zi)
+
+#-----------------------------------------------------------------------------------------
+
+def _SacTime(Head):
+  """
+  Private function to get the start time (datetime) of a SAC
+  trace, i.e. reference time plus begin offset (None if undefined).
+  """
+
+  if 'NZYEAR' not in Head:
+    return None
 
-    # Butterworth filter
-    b, a = _sig.butter(Order, Corners, btype='band')
+  T = _dt.datetime(Head['NZYEAR'], 1, 1, Head.get('NZHOUR', 0), Head.get('NZMIN', 0))
+  T += _dt.timedelta(days=Head.get('NZJDAY', 1)-1,
+                     seconds=Head.get('NZSEC', 0) + Head.get('B', 0.),
+                     milliseconds=Head.get('NZMSEC', 0))
 
-    # Filtering records
-    for I,S in enumerate(self.CHN):
-      # self.CHN[I] = _sig.lfilter(b, a, S)
-      zi = _sig.lfilter_zi(b, a);
-      self.CHN[I],_ = _sig.lfilter(b, a, S, zi=zi*S[0])
+  return T
+
+#-----------------------------------------------------------------------------------------
+
+def _ReadSac(SacFile):
+  """
+  Private function to read a SAC file (samples are loaded in
+  memory, so that reading is done in the calling thread).
+  Output is a tuple (Sac, Error).
+  """
+
+  try:
+    return _ST.Sac(SacFile, Memmap=False), None
+  except Exception as Error:
+    return None, str(Error)
+
+#-----------------------------------------------------------------------------------------
+
+def _ButterSos(Order, LowCorner, HighCorner, FS):
+  """
+  Private function to design (and cache) a Butterworth
+  filter as second-order sections.
+  """
+
+  Key = (int(Order), float(LowCorner), float(HighCorner), float(FS))
+
+  if Key in _SosCache:
+    return _Cached(_SosCache, Key)
+
+  if LowCorner > 0.:
+    Sos = _sig.butter(Order, [2.*LowCorner/FS, 2.*HighCorner/FS],
+                      btype='band', output='sos')
+  else:
+    Sos = _sig.butter(Order, 2.*HighCorner/FS, btype='low', output='sos')
+
+  return _Cached(_SosCache, Key, Sos)
+
+#-----------------------------------------------------------------------------------------
+
+def _Cached(Cache, Key, Value=None):
+  """
+  Private function to get (or store, if a Value is given) an
+  entry of a bounded LRU cache.
+  """
+
+  if Value is None:
+    Value = Cache.pop(Key)
+
+  Cache.pop(Key, None)
+  Cache[Key] = Value
+
+  while len(Cache) > _CacheSize:
+    Cache.popitem(last=False)
+
+  return Value
+
+#-----------------------------------------------------------------------------------------
+
+def _TaperWindow(Length, Window='tukey', Alpha=None):
+  """
+  Private function to build (and cache) a symmetric taper window.
+  Cached windows are shared by all records and are read-only.
+  """
+
+  if Window not in _WinParam:
+    Alpha = None
+
+  Key = (Length, Window, Alpha)
+
+  if Key in _WinCache:
+    return _Cached(_WinCache, Key)
+
+  Win = _sig.get_window(Window if Alpha is None else (Window, Alpha),
+                        Length, fftbins=False)
+  Win.flags.writeable = False
+
+  return _Cached(_WinCache, Key, Win)
+
+#-----------------------------------------------------------------------------------------
+
+def _FreqFilter(Sos, Data, ZeroPhase=False):
+  """
+  Private function to filter records in frequency domain,
+  by multiplication with the filter response. Records are
+  zero-padded to limit wrap-around of the filter transient.
+  """
+
+  NSMP = Data.shape[-1]
+  NFFT = _fft.next_fast_len(2*NSMP)
+
+  # Response at the rfft frequencies (rad/sample)
+  W = 2.*_np.pi*_np.fft.rfftfreq(NFFT)
+  _, H = _sig.sosfreqz(Sos, worN=W)
+
+  if ZeroPhase:
+    H = _np.abs(H)**2
+
+  Spec = _np.fft.rfft(Data, n=NFFT, axis=-1)*H
+
+  return _np.fft.irfft(Spec, n=NFFT, axis=-1)[...,:NSMP]
 
 #-----------------------------------------------------------------------------------------
 
@@ -161,3 +360,69 @@ class Array(object):
       self.Record.append(Station)
     else:
       self.Record.append(Record())
+
+  #---------------------------------------------------------------------------------------
+
+  def ImportSac(self, Path, Pattern='*.SAC', Workers=4):
+    """
+    Bulk import of SAC files from a directory (files matching
+    Pattern) or from a glob expression. Traces of the same
+    station (network, station, location), start time, sampling
+    and length are grouped into multi-channel records, with
+    channels sorted by component name. Records are added in
+    order of network, station and time.
+
+    Files are read using a pool of threads of the given size.
+    Files that cannot be read are reported and skipped. Output
+    is a list of the failures as (File, Error) tuples.
+    """
+
+    if _os.path.isdir(Path):
+      Path = _os.path.join(Path, Pattern)
+
+    File = sorted(_gl.glob(Path))
+
+    # Reading files
+    if Workers > 1 and len(File) > 1:
+      Pool = _mpp.ThreadPool(Workers)
+      try:
+        Parsed = Pool.map(_ReadSac, File)
+      finally:
+        Pool.close()
+        Pool.join()
+    else:
+      Parsed = [_ReadSac(F) for F in File]
+
+    # Grouping traces by station and time window
+    Group = {}
+    Fail = []
+
+    for F, (S, Error) in zip(File, Parsed):
+      if Error:
+        print 'Warning: cannot import {0} ({1})'.format(F, Error)
+        Fail.append((F, Error))
+        continue
+
+      H = S.Head
+      T = _SacTime(H)
+      Start = round((T - _dt.datetime(1970,1,1)).total_seconds()/H['DELTA']) \
+              if T is not None else 0
+
+      Key = (H.get('KNETWK', ''), H.get('KSTNM', ''), H.get('KHOLE', ''),
+             Start, H['DELTA'], H['NPTS'])
+      Group.setdefault(Key, []).append(S)
+
+    for Key in sorted(Group):
+      Trace = sorted(Group[Key], key=lambda S: S.Head.get('KCMPNM', ''))
+
+      R = Record()
+      R.AddSac(Trace[0])
+
+      # Remaining channels stacked at once
+      if len(Trace) > 1:
+        R.AddChannel([S.Data[0] for S in Trace[1:]])
+        R.INF['CHNID'] += [S.Head.get('KCMPNM', '') for S in Trace[1:]]
+
+      self.Record.append(R)
+
+    return Fail
@@ -36,19 +36,21 @@ def TTAverageVelocity(hl, vs, z):
   Input parameters:
     hl = array of n layer thickness (m)
     vs = attay of n seismic velocities (m/s)
-    z = averaging depth (m)
+    z = averaging depth (m), scalar or vector
+
+    Multiple profiles can be given as 2D arrays of
+    shape (nmodel, n), see PackProfiles.
 
   Output:
     vsz = average velocity over depth 'z'
   """
 
-  # Initialisation
-  lnum = len(hl)
-
   # Variable casting
   hl = _np.array(hl, dtype='float')
   vs = _np.array(vs, dtype='float')
-  z = float(z)
+
+  # Initialisation
+  lnum = hl.shape[-1]
 
   # Depth averaging is done on slowness
   vsz = 1./DepthAverage(lnum, hl, 1./vs, z)
@@ -108,6 +110,119 @@ def QwlApproxSolver(hl, vs, dn, fr):
 
 #-----------------------------------------------------------------------------------------
 
+def QwlExactSolver(hl, vs, dn, fr):
+  """
+  This function solves the quarter-wavelength problem
+  (Boore 2003) in closed form. Since the travel-time
+  from the surface is piecewise linear with depth,
+  the quarter-wavelength depth is obtained for all
+  frequencies at once by inverting the cumulative
+  travel-time function (t(z) = 1/(4f)).
+
+  Input parameters:
+
+    hl = vector of n thickness (m)
+    vs = vector of n S-wave velocites (m/s)
+    dn = vector of n densities (gr/m3)
+    fr = vector of discrete frequencies (Hz)
+
+    Multiple profiles can be given as 2D arrays of
+    shape (nmodel, n), see PackProfiles.
+
+  Output:
+
+    qwhl = vector of quarter-wavelength depths
+    qwvs = vector of quarter-wavelength velocities
+    qwdn = vector of quarter-wavelength densities
+  """
+
+  # Initialisation
+  hl = _np.array(hl, dtype='float')
+  vs = _np.array(vs, dtype='float')
+  dn = _np.array(dn, dtype='float')
+  fr = _np.array(fr, dtype='float')
+
+  # Working on profile stacks
+  pshp = hl.shape[:-1]
+  hl = hl.reshape(-1, hl.shape[-1])
+  vs = vs.reshape(hl.shape)
+  dn = dn.reshape(hl.shape)
+
+  # Depth and travel-time at layer interfaces
+  zn = _LayerNodes(hl, _np.ones(hl.shape))
+  tn = _LayerNodes(hl, 1./vs)
+
+  # Quarter-wavelength travel-time
+  qwtt = _np.tile(1./(4.*fr), (hl.shape[0], 1))
+
+  # Inverse of the travel-time function
+  qwhl = _PiecewiseLinear(tn, zn, vs, qwtt)
+
+  # Average velocity (travel-time average)
+  qwvs = qwhl/qwtt
+
+  # Average density
+  qwdn = _DepthIntegral(hl, dn, qwhl)/qwhl
+
+  oshp = pshp + fr.shape
+
+  return qwhl.reshape(oshp), qwvs.reshape(oshp), qwdn.reshape(oshp)
+
+#-----------------------------------------------------------------------------------------
+
+def _LayerNodes(hl, par):
+  """
+  Private function to compute the depth-integral of a
+  parameter at the top of each layer (stack of profiles).
+  """
+
+  nodes = _np.zeros(hl.shape)
+  nodes[:,1:] = _np.cumsum(hl[:,:-1]*par[:,:-1], axis=1)
+
+  return nodes
+
+#-----------------------------------------------------------------------------------------
+
+def _DepthIntegral(hl, par, z):
+  """
+  Private function to compute the integral of a parameter
+  from the surface to depths z (one row of depths per profile).
+  The last layer is assumed to extend indefinitely.
+  """
+
+  zn = _LayerNodes(hl, _np.ones(hl.shape))
+  pn = _LayerNodes(hl, par)
+
+  return _PiecewiseLinear(zn, pn, par, z)
+
+#-----------------------------------------------------------------------------------------
+
+def _PiecewiseLinear(xn, yn, sn, x):
+  """
+  Private function to evaluate a stack of continuous
+  piecewise-linear functions (one per row) from their
+  nodes (xn, yn) and the slope of each segment (sn).
+  The last segment extends indefinitely. Nodes are
+  searched for all rows at once by shifting each row
+  to a separate range of the x-axis.
+  """
+
+  rnum, nnum = xn.shape
+  rows = _np.arange(rnum)[:,None]
+
+  # Row shift (only finite values define the range)
+  xall = _np.append(xn.ravel(), x[_np.isfinite(x)])
+  shift = rows*(_np.ptp(xall) + 1.)
+
+  # Segment index of each point
+  idx = _np.searchsorted((xn + shift).ravel(), (x + shift).ravel(),
+                         side='right').reshape(x.shape)
+  idx = _np.clip(idx - 1 - rows*nnum, 0, nnum-1)
+
+  return yn[rows,idx] + (x - xn[rows,idx])*sn[rows,idx]
+
+#-----------------------------------------------------------------------------------------
+
 def QwlFitFunc(z, lnum, hl, sl, fr):
   """
   Misfit function (simple L1 norm)
@@ -151,27 +266,39 @@ def QwlImpedance(qwvs, qwdn, vsr=[], dnr=[]):
 
 def DepthAverage(lnum, hl, par, z):
   """
-  Search function to compute depth-weighted
-  average of a generic parameter (slowness, density...)
+  Compute the depth-weighted average of a generic parameter
+  (slowness, density...) from the surface down to depth z,
+  using the first lnum layers of the profile. The last layer
+  is assumed to extend indefinitely.
+
+  Input parameters:
+    hl = vector of n thickness, or 2D array (nmodel, n)
+    par = parameter vector(s), same size of hl
+    z = averaging depth(s), scalar or vector
+
+  Output:
+    average(s) with shape (nmodel, nz), where dimensions
+    not present in the input are removed
   """
 
-  ztot = 0.
-  sum = 0.
-  islast = False
+  hl = _np.array(hl, dtype='float')[...,:lnum]
+  par = _np.array(par, dtype='float')[...,:lnum]
+  z = _np.array(z, dtype='float')
 
-  for nl in range(lnum):
+  # Working on profile stacks
+  pshp = hl.shape[:-1]
+  hl = hl.reshape(-1, lnum)
+  par = par.reshape(hl.shape)
 
-    if ((ztot + hl[nl]) < z) and (nl != lnum-1):
-      sum += (hl[nl]*par[nl])
+  # Same depths for all profiles
+  zz = _np.tile(z.ravel(), (hl.shape[0], 1))
 
-    else:
-      if islast == False:
-        sum += (z - ztot)*par[nl]
-        islast = True
+  avg = (_DepthIntegral(hl, par, zz)/zz).reshape(pshp + z.shape)
 
-    ztot += hl[nl]
+  if avg.ndim == 0:
+    avg = float(avg)
 
-  return sum/z
+  return avg
 
 #-----------------------------------------------------------------------------------------
 
@@ -180,160 +307,537 @@ def Kappa0(hl, vs, qs, z=[]):
   This function calucalted the attenuation parameter
   Kappa(0) from a soil profile down to an arbitrary
   depth z.
+
+  Multiple profiles can be given as 2D arrays of
+  shape (nmodel, n); in such case z can be either
+  a scalar or a vector with one depth per profile.
   """
 
   # Initialisation
-  lnum = len(hl)
-
-  hl = _np.array(hl)
-  vs = _np.array(vs)
-  qs = _np.array(qs)
+  hl = _np.array(hl, dtype='float')
+  vs = _np.array(vs, dtype='float')
+  qs = _np.array(qs, dtype='float')
 
   # If z not given, using the whole profile
-  if not z:
-    z = _np.sum(hl)
+  if _np.size(z) == 0:
+    z = _np.sum(hl, axis=-1)
 
-  # Elastic property vector
-  par = z/(vs*qs)
+  # Working on profile stacks
+  pshp = hl.shape[:-1]
+  hl = hl.reshape(-1, hl.shape[-1])
+  vs = vs.reshape(hl.shape)
+  qs = qs.reshape(hl.shape)
 
-  # Computing attenuation
-  kappa0 = DepthAverage(lnum, hl, par, z)
+  zz = _np.zeros((hl.shape[0], 1))
+  zz[:] = _np.reshape(z, (-1, 1))
+
+  # Computing attenuation (integral of the elastic property)
+  kappa0 = _DepthIntegral(hl, 1./(vs*qs), zz).reshape(pshp)
+
+  if kappa0.ndim == 0:
+    kappa0 = float(kappa0)
 
   return kappa0
 
 #-----------------------------------------------------------------------------------------
 
-def ShTransferFunction(Hl, Vs, Dn, Qs, Freq, Iang=0., Elastic=False):
+def ShTransferFunction(Hl, Vs, Dn, Qs, Freq, Iang=0., Elastic=False, Layers=False):
   """
   SH wave transfer function using Knopoff formalism.
+  The layer boundary conditions are solved by propagating the
+  up/down-going wave amplitudes from the free surface to the
+  half-space (Thomson-Haskell recursion), for all frequencies
+  at once.
+
+  Profiles can be given as single vectors of n layers or as
+  stacks of equal-size profiles with shape (nmodel, n), see
+  PackProfiles. Output has shape (nfreq, 1) or (nmodel, nfreq, 1).
+  For stacks, frequencies can also be given separately for each
+  model, with shape (nmodel, nfreq).
+
+  With Layers, the output is a tuple (htf, A, B, Kz), including
+  the up and down-going wave amplitudes at the top of each layer,
+  normalised to the half-space input amplitude, and the vertical
+  wavenumbers, all with shape (..., n, nfreq). The displacement
+  within a layer at depth z from its top is A*exp(i*Kz*z) +
+  B*exp(-i*Kz*z). Note that the exp(-iwt) time convention is used.
   Authors: Poggi Valerio, Marwan Irnaka
   """
 
+  ns, zm = _ShSlowness(Vs, Dn, Qs, Iang, Elastic)
+
+  return _ShPropagate(Hl, ns, zm, Freq, Layers)
+
+#-----------------------------------------------------------------------------------------
+
+def _ShSlowness(Vs, Dn, Qs, Iang=0., Elastic=False):
+  """
+  Private function to compute the vertical slowness and the
+  impedance of the layers (layer axis is moved before frequency).
+  """
+
   # Variable recasting
-  nlayer = len(Hl)
-  hl = _np.array(Hl,dtype='complex128')
-  vs = _np.array(Vs,dtype='complex128')
-  dn = _np.array(Dn,dtype='complex128')
-  qs = _np.array(Qs,dtype='complex128')
-  freq = _np.array(Freq)
+  vs = _np.array(Vs,dtype='complex128')[...,None]
+  dn = _np.array(Dn,dtype='complex128')[...,None]
+  qs = _np.array(Qs,dtype='complex128')[...,None]
   iang = _np.array(Iang)
 
-  # Angular frequency conversion
-  angf = 2.*_np.pi*freq
-
   # Attenuation using complex velocities
   if not Elastic:
     vs = vs*((2.*qs*1j)/(2.*qs*1j-1.))
 
-  # Angle of propagation within layers
-  iD = _np.zeros((nlayer,1))
-  iCORE = _np.zeros((nlayer,nlayer),dtype='complex128')
+  # Angle of propagation within layers (Snell's law,
+  # incidence angle is given at the half-space)
+  iS = _np.arcsin(_np.sin(iang)*vs/vs[...,-1:,:])
 
-  iD[0] = _np.sin(iang)
-  iCORE[0,-1] = 1.
+  # Lame Parameter(s)
+  mu = dn*(vs**2)
 
-  for nl in range(nlayer-1):
-      iCORE[nl+1,nl] = 1./vs[nl]
-      iCORE[nl+1,nl+1] = -1./vs[nl+1]
+  # Horizontal and vertical slowness
+  ns = _np.cos(iS)/vs
 
-  iA = _np.linalg.solve(iCORE,iD)
+  # Layer impedance
+  zm = mu*ns
 
-  iS = _np.arcsin(iA)
+  return ns, zm
 
-  # Lame Parameter(s)
-  mu = _np.zeros((nlayer,1),dtype='complex128')
-
-  for nl in range(nlayer):
-      mu[nl]=dn[nl]*(vs[nl]**2)
+#-----------------------------------------------------------------------------------------
 
-  # Horizontal and vertical slowness
-  ns = _np.zeros((nlayer,1),dtype='complex128')
+def _ShPropagate(Hl, ns, zm, Freq, Layers=False):
+  """
+  Private function to solve the SH-wave propagation through
+  the layers (see ShTransferFunction), given their vertical
+  slowness and impedance.
+  """
 
-  for nl in range(nlayer):
-      ns[nl]=_np.cos(iS[nl])/vs[nl]
+  hl = _np.array(Hl,dtype='complex128')[...,None]
+  freq = _np.array(Freq,dtype='float')
+  nlayer = hl.shape[-2]
 
-  # Building data vector
-  A = _np.zeros((nlayer*2,1))
-  D = _np.zeros((nlayer*2,1))
-  D[-1] = 1.
+  # Angular frequency conversion
+  angf = 2.*_np.pi*freq
 
-  # Dispacement and transfer function initialisation
-  fnum = len(Freq)
-  htu = _np.zeros((fnum,1),dtype='complex128')
-  hbu = _np.zeros((fnum,1),dtype='complex128')
-  htf = _np.zeros((fnum,1),dtype='complex128')
+  # Free surface constraint (unit displacement amplitudes)
+  shape = _np.broadcast(hl[...,0,:], freq).shape
+  A = _np.ones(shape,dtype='complex128')
+  B = _np.ones(shape,dtype='complex128')
 
-  for nf, af in enumerate(angf):
+  # Amplitudes are kept as A*exp(sc), B*exp(sc), to avoid
+  # overflow of evanescent layers (e.g. velocity inversions
+  # at oblique incidence)
+  sc = _np.zeros(shape)
 
-    # Building core matrix
-    CORE = _np.zeros((nlayer*2,nlayer*2),dtype='complex128')
+  if Layers:
+    lshape = shape[:-1] + (nlayer,) + shape[-1:]
+    LA = _np.zeros(lshape, dtype='complex128')
+    LB = _np.zeros(lshape, dtype='complex128')
+    LS = _np.zeros(lshape)
 
-    # Free surface constraints
-    CORE[0,0] = 1.
-    CORE[0,1] = -1.
+  with _np.errstate(over='ignore', under='ignore'):
 
-    # Interfaces constraints
+    # Interfaces constraints (continuity of displacement and stress)
     for nl in range(nlayer-1):
 
-      row = (nl*2)+1
-      col = nl*2
+      if Layers:
+        LA[...,nl,:], LB[...,nl,:], LS[...,nl,:] = A, B, sc
+
+      dsa = 1j*angf*ns[...,nl,:]*hl[...,nl,:]
+      dsr = _np.abs(dsa.real)
+
+      A *= _np.exp(dsa - dsr)
+      B *= _np.exp(-dsa - dsr)
+      sc = sc + dsr
+
+      uu = A + B
+      ss = (A - B)*(zm[...,nl,:]/zm[...,nl+1,:])
+
+      A = 0.5*(uu + ss)
+      B = 0.5*(uu - ss)
+
+  # Computing displacements (normalised to the input amplitude)
+  with _np.errstate(divide='ignore', invalid='ignore', under='ignore'):
+    htf = _np.exp(-sc)/B
+
+  htf[~_np.isfinite(htf)] = _np.nan
+
+  if Layers:
+    LA[...,-1,:], LB[...,-1,:], LS[...,-1,:] = A, B, sc
+
+    with _np.errstate(divide='ignore', invalid='ignore', under='ignore'):
+      Norm = _np.exp(LS - sc[...,None,:])/B[...,None,:]
+      LA *= Norm
+      LB *= Norm
+
+    Kz = _np.broadcast_to(angf[...,None,:]*ns, lshape)
+
+    return htf[...,None], LA, LB, Kz
+
+  return htf[...,None]
+
+#-----------------------------------------------------------------------------------------
+
+def ResonancePrediction(Hl, Vs, Num=8):
+  """
+  Predict the lowest Num resonance frequencies of soil profiles
+  from the travel-time to each layer interface (quarter-wavelength
+  resonances (2n+1)/(4tt) of the layers above the interface).
+  Output has shape (Num) or (nmodel, Num).
+  """
+
+  hl = _np.array(Hl, dtype='float')
+  vs = _np.array(Vs, dtype='float')
+
+  single = (hl.ndim == 1)
+  hl = hl.reshape(-1, hl.shape[-1])
+  vs = vs.reshape(hl.shape)
+
+  # Travel-time to the interfaces
+  tt = _LayerNodes(hl, 1./vs)[:,1:]
+
+  # Interfaces below zero-thickness (padding) layers are skipped
+  tt[hl[:,:-1] <= 0.] = 0.
+
+  with _np.errstate(divide='ignore'):
+    fr = (2.*_np.arange(Num) + 1.)/(4.*tt[...,None])
 
-      expDSA = _np.exp(1j*af*ns[nl]*hl[nl])
-      expUSA = _np.exp(-1j*af*ns[nl]*hl[nl])
+  fr = _np.sort(fr.reshape(hl.shape[0], -1), axis=1)[:,:Num]
 
-      CORE[row,col+0] = expDSA[0]
-      CORE[row,col+1] = expUSA[0]
-      CORE[row,col+2] = -1.
-      CORE[row,col+3] = -1.
+  return fr[0] if single else fr
 
-      CORE[row+1,col+0] =  mu[nl][0]*ns[nl][0]*expDSA[0]
-      CORE[row+1,col+1] = -mu[nl][0]*ns[nl][0]*expUSA[0]
-      CORE[row+1,col+2] = -mu[nl+1][0]*ns[nl+1][0]
-      CORE[row+1,col+3] =  mu[nl+1][0]*ns[nl+1][0]
+#-----------------------------------------------------------------------------------------
+
+def AdaptiveShTransferFunction(Hl, Vs, Dn, Qs, Fmin=0.1, Fmax=100.,
+                                                Fnum=40,
+                                                Peaks=8,
+                                                Tol=0.02,
+                                                MaxSamples=100,
+                                                MaxLevel=12,
+                                                Iang=0.,
+                                                Elastic=False):
+  """
+  SH wave transfer function on adaptive frequency samples.
+
+  Initial samples are a log-spaced axis of Fnum samples and the
+  lowest Peaks predicted resonances (see ResonancePrediction).
+  The intervals next to each local maximum of the amplitude are
+  then bisected (on log-frequency) until the function at the
+  midpoint differs from the linear interpolation by less than Tol
+  (relative to the local amplitude), up to MaxLevel times. Higher
+  peaks are refined first, and each model uses at most MaxSamples
+  samples (or the initial ones, if more).
+
+  Output is a tuple of frequencies and transfer function, with
+  shape (nsample) and (nsample, 1), or (nmodel, nsample) and
+  (nmodel, nsample, 1); frequencies are sorted but not equally
+  spaced (see AdaptiveInterp). Models with fewer samples are
+  padded with repetitions of the last sample (Fmax).
+  """
+
+  hl = _np.array(Hl, dtype='float')
+  single = (hl.ndim == 1)
+
+  hl = hl.reshape(-1, hl.shape[-1])
+  vs = _np.array(Vs, dtype='float').reshape(hl.shape)
+  dn = _np.array(Dn, dtype='float').reshape(hl.shape)
+  qs = _np.array(Qs, dtype='float').reshape(hl.shape)
+  nmod = hl.shape[0]
+
+  ns, zm = _ShSlowness(vs, dn, qs, Iang, Elastic)
+
+  def Solve(row, fr):
+    # Layer terms are repeated for each sample (in chunks)
+    out = _np.zeros(fr.shape, dtype='complex128')
+    for c in range(0, fr.size, 100000):
+      r = row[c:c+100000]
+      out[c:c+100000] = _ShPropagate(hl[r], ns[r], zm[r], fr[c:c+100000,None])[:,0,0]
+    return out
+
+  # Coarse axis and predicted resonances
+  fc = FrequencyAxis(Fmin, Fmax, Fnum, Log=True)
+  fp = _np.clip(ResonancePrediction(hl, vs, Peaks), Fmin, Fmax)
+
+  # Samples of all models (model index, frequency)
+  row = _np.concatenate((_np.repeat(_np.arange(nmod), fc.size),
+                         _np.repeat(_np.arange(nmod), fp.shape[1])))
+  fr = _np.concatenate((_np.tile(fc, nmod), fp.ravel()))
+
+  idx = _np.lexsort((fr, row))
+  row, fr = row[idx], fr[idx]
+  keep = _np.append(True, (row[1:] != row[:-1]) | (fr[1:] > fr[:-1]))
+  row, fr = row[keep], fr[keep]
+  tf = Solve(row, fr)
+
+  # Intervals within tolerance (not to be split again)
+  done = _np.zeros(fr.size - 1, dtype='bool')
+
+  for Level in range(MaxLevel):
+
+    # Local maxima of the amplitude (within each model)
+    amp = _np.abs(tf)
+    same = (row[1:] == row[:-1]) & (fr[1:] > fr[:-1])
+    up = same & (amp[1:] > amp[:-1])
+    dw = same & (amp[1:] < amp[:-1])
+    top = _np.insert(up, 0, False) & _np.append(dw, False)
+
+    # Intervals next to the maxima (sorted by model and frequency)
+    cnd = (top[:-1] | top[1:]) & same & ~done
+    k = _np.nonzero(cnd)[0]
+    k = k[_np.lexsort((-_np.maximum(amp[k], amp[k+1]), row[k]))]
+
+    # Sample budget of each model (higher peaks first)
+    left = MaxSamples - _np.bincount(row, minlength=nmod)
+    k = _np.sort(k[_RowPos(row[k], nmod) < left[row[k]]])
+
+    if not k.size:
+      break
+
+    # Midpoints of the candidate intervals (log-frequency)
+    rm = row[k]
+    fm = _np.sqrt(fr[k]*fr[k+1])
+    tm = Solve(rm, fm)
+
+    # Error of the linear interpolation (relative to local amplitude)
+    tl = 0.5*(tf[k] + tf[k+1])
+
+    with _np.errstate(invalid='ignore'):
+      ref = _np.max([_np.abs(tm), amp[k], amp[k+1],
+                     _np.full(tm.shape, 1e-3)], axis=0)
+      good = ~(_np.abs(tm - tl)/ref > Tol)
+
+    # Midpoints are inserted in their interval (order is kept),
+    # both halves of a split interval inherit its state
+    row = _np.insert(row, k+1, rm)
+    fr = _np.insert(fr, k+1, fm)
+    tf = _np.insert(tf, k+1, tm)
+    done[k] = good
+    done = _np.insert(done, k+1, good)
+
+  # Padding with the last sample of each model (Fmax)
+  pos = _RowPos(row, nmod)
+  last = _np.cumsum(_np.bincount(row, minlength=nmod)) - 1
+
+  Fr = _np.repeat(fr[last][:,None], pos.max() + 1, axis=1)
+  Tf = _np.repeat(tf[last][:,None], pos.max() + 1, axis=1)
+  Fr[row,pos] = fr
+  Tf[row,pos] = tf
+
+  if single:
+    return Fr[0], Tf[0,:,None]
+
+  return Fr, Tf[...,None]
 
-    # input constraints
-    CORE[-1,-1] = 1.
+#-----------------------------------------------------------------------------------------
 
-    # solving linear system
-    try:
-        A = _np.linalg.solve(CORE,D)
-    except:
-        A[:] = _np.nan
+def _RowPos(row, nrow):
+  """
+  Private function to get the position of each element within
+  its row, from the row indexes (sorted in ascending order).
+  """
 
-    # Computing displacements
-    htu[nf] = A[0]+A[1]
-    hbu[nf] = 2*A[-1]
-    htf[nf] = htu[nf]/hbu[nf]
+  cnt = _np.bincount(row, minlength=nrow)
 
-  return htf
+  return _np.arange(row.size) - _np.repeat(_np.cumsum(cnt) - cnt, cnt)
 
 #-----------------------------------------------------------------------------------------
 
-def GetResFreq(Freq, AmpF):
+def AdaptiveInterp(Freq, Htf, NewFreq):
+  """
+  Interpolate transfer functions computed on adaptive (irregular)
+  frequency samples onto a new frequency axis, linearly on
+  log-frequency. Values outside the sampled range are constant.
+  Input and output shapes are as for AdaptiveShTransferFunction.
+  """
+
+  freq = _np.array(Freq, dtype='float')
+  single = (freq.ndim == 1)
+
+  freq = freq.reshape(-1, freq.shape[-1])
+  htf = _np.array(Htf).reshape(freq.shape)
+  new = _np.array(NewFreq, dtype='float')
+
+  # Nodes and slopes of each segment (last one is flat)
+  xn = _np.log(freq)
+  sn = _np.zeros(htf.shape, dtype=htf.dtype)
+
+  with _np.errstate(divide='ignore', invalid='ignore'):
+    sn[:,:-1] = _np.diff(htf, axis=1)/_np.diff(xn, axis=1)
+
+  sn[~_np.isfinite(sn)] = 0.
+
+  x = _np.log(_np.clip(new[None,:], freq[:,:1], freq[:,-1:]))
+  out = _PiecewiseLinear(xn, htf, sn, x)
+
+  return out[0,:,None] if single else out[...,None]
+
+#-----------------------------------------------------------------------------------------
+
+def PackProfiles(Hl, *Par):
+  """
+  Pack a list of soil profiles with arbitrary number of layers
+  into 2D arrays of shape (nmodel, nlayer), to be used with
+  the vectorized functions of this module.
+
+  Shorter profiles are padded at the bottom with zero-thickness
+  layers having the properties of the half-space, which leaves
+  depth averages and transfer functions unchanged (the thickness
+  of the half-space, not used, is set to zero as well).
+
+  Input parameters:
+    Hl = list of layer thickness vectors (one per model)
+    Par = any number of lists of parameter vectors (Vs, Dn...)
+
+  Output:
+    tuple of 2D arrays, thickness first
+  """
+
+  # Layer number of each model
+  lnum = _np.array([len(h) for h in Hl])
+  loff = _np.cumsum(lnum) - lnum
+
+  # Contiguous layer storage
+  data = [_np.concatenate([_np.array(h, dtype='float') for h in Hl])]
+  for P in Par:
+    data.append(_np.concatenate([_np.array(p, dtype='float') for p in P]))
+
+  data = PadRagged(_np.column_stack(data), loff, lnum)
+
+  return tuple(data[:,:,i] for i in range(data.shape[2]))
+
+#-----------------------------------------------------------------------------------------
+
+def PadRagged(Data, LayOff, LayNum):
+  """
+  Gather soil profiles stored contiguously (one layer per row,
+  the first column being thickness) into a padded 3D array of
+  shape (nmodel, nlayer, npar). Profiles are identified by the
+  index of the first layer (LayOff) and the number of layers
+  (LayNum). Padding is done as in PackProfiles.
+  """
+
+  LayOff = _np.array(LayOff, dtype='int')
+  LayNum = _np.array(LayNum, dtype='int')
+
+  lmax = _np.max(LayNum) if LayNum.size else 0
+
+  # Index of the source layer (half-space is repeated)
+  lidx = _np.arange(lmax)
+  gidx = LayOff[:,None] + _np.minimum(lidx, LayNum[:,None]-1)
+
+  Out = _np.array(Data, dtype='float')[gidx]
+
+  # Half-space and padding layers have zero thickness
+  Out[:,:,0][lidx >= LayNum[:,None]-1] = 0.
+
+  return Out
+
+#-----------------------------------------------------------------------------------------
+
+def GetResFreq(Freq, AmpF, Refine=False, Prominence=0.):
   """
   Identify resonance frequencies of an amplification function.
   Output are two arrays: resonce frequencies and amplitude maxima.
+
+  A stack of amplification functions of shape (nmodel, nfreq) can
+  be given; output are then two lists of arrays (one per model).
+  The frequency axis can be common or given for each model.
+  Local maxima of all models are found at once. With Refine, peaks
+  are located between samples by parabolic interpolation on
+  log-frequency. Peaks of prominence (height over the highest of
+  the minima separating them from the nearest higher peaks, or from
+  the ends of the axis) lower than Prominence are discarded.
   """
 
-  Fn = _np.array([])
-  An = _np.array([])
+  freq = _np.array(Freq, dtype='float')
+  amp = _np.abs(_np.array(AmpF))
+  nf = freq.shape[-1]
 
-  AmpF = _np.abs(AmpF)
+  # Transfer functions stored as column vectors
+  if amp.ndim > 1 and amp.shape[-1] == 1 and amp.shape[-2] == nf:
+    amp = amp[...,0]
 
-  for nf, fr in enumerate(Freq[:-2]):
+  single = (amp.ndim == 1)
+  amp = amp.reshape(-1, nf)
+  freq = _np.broadcast_to(freq.reshape(-1, nf), amp.shape)
 
-    # Three-points search for local maxima
-    a0 = AmpF[nf]
-    a1 = AmpF[nf+1]
-    a2 = AmpF[nf+2]
+  # Three-points search for local maxima
+  a0 = amp[:,:-2]
+  a1 = amp[:,1:-1]
+  a2 = amp[:,2:]
+
+  row, col = _np.nonzero(((a1-a0) > 0) & ((a2-a1) < 0))
+  col += 1
+
+  Fn = freq[row,col]
+  An = amp[row,col]
+
+  if Prominence > 0. and row.size:
+
+    # Segments to the nearest higher peaks (or to the axis ends)
+    flat = _np.append(amp.ravel(), _np.inf)
+    pk = row*nf + col
+
+    prv = _NearestHigher(An, row, -1)
+    nxt = _NearestHigher(An, row, 1)
+
+    ls = _np.where(prv >= 0, pk[prv], row*nf)
+    re = _np.where(nxt >= 0, pk[nxt], row*nf + nf-1)
+
+    minl = _np.minimum.reduceat(flat, _np.column_stack((ls, pk+1)).ravel())[::2]
+    minr = _np.minimum.reduceat(flat, _np.column_stack((pk, re+1)).ravel())[::2]
+
+    keep = (An - _np.maximum(minl, minr)) >= Prominence
+
+    row, col, Fn, An = row[keep], col[keep], Fn[keep], An[keep]
+
+  if Refine and row.size:
+
+    # Parabola through the three samples (log-frequency axis)
+    with _np.errstate(divide='ignore', invalid='ignore'):
+      lf = _np.log(freq)
+
+    x0, x1, x2 = lf[row,col-1], lf[row,col], lf[row,col+1]
+    y0, y1, y2 = amp[row,col-1], An, amp[row,col+1]
+
+    with _np.errstate(divide='ignore', invalid='ignore'):
+      d1 = (y1-y0)/(x1-x0)
+      d2 = (y2-y1)/(x2-x1)
+      c2 = (d2-d1)/(x2-x0)
+      xp = 0.5*(x0 + x1) - d1/(2.*c2)
+      yp = y0 + (xp-x0)*(d1 + c2*(xp-x1))
+
+    ok = _np.isfinite(xp) & _np.isfinite(yp) & (c2 < 0)
+    Fn = _np.where(ok, _np.exp(xp), Fn)
+    An = _np.where(ok, yp, An)
+
+  if single:
+    return Fn, An
+
+  # Split by model
+  cut = _np.cumsum(_np.bincount(row, minlength=amp.shape[0]))[:-1]
+
+  return _np.split(Fn, cut), _np.split(An, cut)
+
+#-----------------------------------------------------------------------------------------
+
+def _NearestHigher(an, row, step):
+  """
+  Private function to find, for each peak, the index of the nearest
+  higher peak of the same model in the given direction (-1 if none).
+  Neighbour links are followed by pointer jumping for all peaks at once.
+  """
 
-    if (a1-a0) > 0 and (a2-a1) < 0:
+  idx = _np.arange(an.size) + step
+  out = (idx < 0) | (idx >= an.size)
+  idx[out] = -1
+  idx[~out] = _np.where(row[idx[~out]] == row[~out], idx[~out], -1)
 
-      # Storing value
-      Fn = _np.append(Fn,fr)
-      An = _np.append(An,a1)
+  while True:
+    jump = (idx >= 0) & (an[idx] <= an)
+    if not _np.any(jump):
+      break
+    idx[jump] = idx[idx[jump]]
 
-  return Fn, An
+  return idx
 
 #-----------------------------------------------------------------------------------------
 
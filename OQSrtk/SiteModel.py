@@ -23,16 +23,28 @@ Base class to store and analyse site information
 """
 
 import numpy as _np
+import multiprocessing as _mp
+import multiprocessing.pool as _mpp
 
 import SiteMethods as _SM
+import RvtMethods as _RM
+import EqlMethods as _EM
+import RandomMethods as _RA
 import AsciiTools as _AT
+import BinaryTools as _BT
+import CacheTools as _CT
 import Utils as _UT
 
 #-----------------------------------------------------------------------------------------
 
-# Precision for decimal rounding
+# Precision for decimal rounding of the results
+# (None to keep full precision)
 Decimal = 4
 
+# Precision of single result types, overriding Decimal
+# (keys: Vz, Qwl, Imp, K0, Att, Res, Rsa, Eql, Rnd)
+Precision = {}
+
 #-----------------------------------------------------------------------------------------
 
 class Model(object):
@@ -42,8 +54,8 @@ class Model(object):
   """
 
   ParKeys = ['Hl','Vp','Vs','Dn','Qp','Qs']
-  EngKeys = ['Vz','Qwl','K0','Gc']
-  AmpKeys = ['Stf','Imp','Att','Res']
+  EngKeys = ['Vz','Qwl','K0','Gc','Eql']
+  AmpKeys = ['Stf','Imp','Att','Res','Rsa','Eql']
 
   #---------------------------------------------------------------------------------------
 
@@ -54,8 +66,12 @@ class Model(object):
     self.AmpInit()
 
   def ParInit(self):
-    self.Par = {}
-    for K in self.ParKeys: self.Par[K] = []
+    # Layer properties are stored as columns (ParKeys order)
+    # of a float array, missing values are NaN. The array can
+    # be larger than the actual number of layers (LayNum),
+    # to allow cheap appending.
+    self.Buf = _np.zeros((0,len(self.ParKeys)))
+    self.LayNum = 0
 
   def EngInit(self):
     self.Eng = {}
@@ -67,6 +83,38 @@ class Model(object):
 
   #---------------------------------------------------------------------------------------
 
+  @property
+  def Data(self):
+    """
+    Layer property array (nlayer, nkey), not a copy.
+    """
+    return self.Buf[:self.LayNum]
+
+  @property
+  def Par(self):
+    """
+    Dictionary of layer properties (arrays are not copies).
+    Assigning a key (e.g. Par['Vs'] = [...]) writes the values
+    into the profile, which must have the same number of layers.
+    Assigning a whole dictionary replaces the profile (missing
+    keys are NaN).
+    """
+    return _ParDict(self)
+
+  @Par.setter
+  def Par(self, Par):
+    LayNum = max([len(_np.atleast_1d(V)) for V in Par.values()] + [0])
+
+    self.Buf = _np.zeros((LayNum, len(self.ParKeys)))
+    self.Buf[:] = _np.nan
+    self.LayNum = LayNum
+
+    P = self.Par
+    for K in Par:
+      P[K] = Par[K]
+
+  #---------------------------------------------------------------------------------------
+
   def AddLayer(self, Data, Index=-1):
     """
     Method to add a data layer to the soil profile at arbitrary location.
@@ -75,28 +123,104 @@ class Model(object):
     """
 
     Index = int(Index)
+    if Index < 0: Index = self.LayNum
+    Index = min(Index, self.LayNum)
 
-    # Case: List
-    if type(Data) is list:
-      for I, K in enumerate(self.ParKeys):
-        if Index < 0: Index = len(self.Par[K])
-        self.Par[K].insert(Index, _UT.NoneCheck(Data[I]))
+    Row = _np.zeros(len(self.ParKeys))
+    Row[:] = _np.nan
 
     # Case: Dictionary
-    if type(Data) is dict:
-      for K in self.ParKeys:
-        if Index < 0: Index = len(self.Par[K])
+    if isinstance(Data, dict):
+      for I, K in enumerate(self.ParKeys):
         if K in Data.keys():
-          self.Par[K].insert(Index, _UT.NoneCheck(Data[K]))
+          Row[I] = _NanCheck(Data[K])
+
+    # Case: Sequence (list, tuple, array)
+    elif isinstance(Data, (list, tuple, _np.ndarray)):
+      for I in range(len(self.ParKeys)):
+        Row[I] = _NanCheck(Data[I])
+
+    else:
+      raise TypeError('Layer data must be a sequence or a dictionary')
+
+    # Extending storage (capacity is doubled)
+    if self.LayNum == self.Buf.shape[0]:
+      Buf = _np.zeros((max(2*self.LayNum, 4), len(self.ParKeys)))
+      Buf[:self.LayNum] = self.Buf[:self.LayNum]
+      self.Buf = Buf
+
+    # Shifting following layers
+    self.Buf[Index+1:self.LayNum+1] = self.Buf[Index:self.LayNum].copy()
+    self.Buf[Index] = Row
+    self.LayNum += 1
+
+  #---------------------------------------------------------------------------------------
+
+  def AddLayers(self, Data, Header=[]):
+    """
+    Method to append multiple layers from a 2D array (one layer per row).
+    Columns are sorted according to the ParKeys list or identified by
+    the given header (other columns are ignored, missing keys are NaN).
+    """
+
+    Data = _np.array(Data, dtype='float', ndmin=2)
+
+    if not Header:
+      Header = self.ParKeys
+
+    LayNum = self.LayNum + Data.shape[0]
+
+    # Extending storage
+    if LayNum > self.Buf.shape[0]:
+      Buf = _np.zeros((max(2*self.LayNum, LayNum), len(self.ParKeys)))
+      Buf[:self.LayNum] = self.Buf[:self.LayNum]
+      self.Buf = Buf
+
+    self.Buf[self.LayNum:LayNum] = _np.nan
+
+    for I, K in enumerate(Header):
+      if K in self.ParKeys:
+        self.Buf[self.LayNum:LayNum,self.ParKeys.index(K)] = Data[:,I]
+
+    self.LayNum = LayNum
 
   #---------------------------------------------------------------------------------------
 
   def DelLayer(self, Index=-1):
     """
+    Remove a data layer from the soil profile.
     """
 
     Index = int(Index)
-    del self.Par[Index]
+    if Index < 0: Index += self.LayNum
+
+    self.Buf[Index:self.LayNum-1] = self.Buf[Index+1:self.LayNum].copy()
+    self.LayNum -= 1
+
+#-----------------------------------------------------------------------------------------
+
+class _ParDict(dict):
+  """
+  Private dictionary of the layer properties of a model,
+  writing assigned keys back into the model storage.
+  """
+
+  def __init__(self, Mod):
+
+    dict.__init__(self, ((K, Mod.Buf[:Mod.LayNum,I])
+                         for I, K in enumerate(Mod.ParKeys)))
+    self.Mod = Mod
+
+  def __setitem__(self, Key, Value):
+
+    if Key not in self.Mod.ParKeys:
+      raise KeyError(Key)
+
+    I = self.Mod.ParKeys.index(Key)
+    Col = self.Mod.Buf[:self.Mod.LayNum,I]
+    Col[:] = [_NanCheck(V) for V in _np.atleast_1d(Value)]
+
+    dict.__setitem__(self, Key, Col)
 
 #-----------------------------------------------------------------------------------------
 
@@ -182,8 +306,12 @@ class Site1D(object):
 
     Index = int(Index)
 
-    for D in Table.data:
-      self.Mod[Index].AddLayer(D)
+    # Numerical tables are added as a whole
+    if Table.array is not None:
+      self.Mod[Index].AddLayers(Table.array, Table.header)
+    else:
+      for D in Table.data:
+        self.Mod[Index].AddLayer(D)
 
   #---------------------------------------------------------------------------------------
 
@@ -195,6 +323,21 @@ class Site1D(object):
 
   #---------------------------------------------------------------------------------------
 
+  def Stack(self, Keys, Mod=[]):
+    """
+    Return the layer properties of all site models (or of the given
+    list of models) as 2D arrays of shape (nmodel, nlayer), padded to
+    equal layer number (see SiteMethods.PackProfiles).
+    Thickness is always returned first, followed by the given keys.
+    """
+
+    if not Mod:
+      Mod = self.Mod
+
+    return _Stack(Mod, Keys)
+
+  #---------------------------------------------------------------------------------------
+
   def ComputeTTAV(self, Key='Vs', Z=30., Index=[], Stat=True):
     """
     Compute and store travel-time average velocity at a given depth (Z).
@@ -212,29 +355,34 @@ class Site1D(object):
         Index = [Index]
       Mod = [self.Mod[i] for i in Index]
 
-    for M in Mod:
+    if not Mod:
+      return
 
-      # Initialise Vz data structure
-      M.Eng['Vz'] = {}
+    # Compute average velocity (all models and depths)
+    Hl, Vs = self.Stack([Key], Mod)
+    Vz = _SM.TTAverageVelocity(Hl, Vs, Z)
+
+    self._StoreTTAV(Mod, Z, Vz, Stat)
+
+  def _StoreTTAV(self, Mod, Z, Vz, Stat):
+    """
+    Private method to store average velocities of the site models.
+    """
 
-      for z in Z:
-        # Compute average velocity
-        Vz = _SM.TTAverageVelocity(M.Par['Hl'], M.Par[Key], z)
+    Vz = _Round(_np.array(Vz, dtype='float'), 'Vz')
 
-        M.Eng['Vz'][z] = _UT.Round(Vz, Decimal)
+    for I, M in enumerate(Mod):
+      M.Eng['Vz'] = dict(zip(Z, Vz[I].tolist()))
 
     if Stat:
       # Initialise Vz data structure
       self.Eng['Vz'] = {}
 
-      for z in Z:
-        # Extracting Vz data from site models
-        Data = [M.Eng['Vz'][z] for M in Mod]
-
+      for J, z in enumerate(Z):
         # Compute Vz statistic
-        Mn, Sd = _UT.LogStat(Data)
-        self.Eng['Vz'][float(z)] = (_UT.Round(Mn, Decimal),
-                                    _UT.Round(Sd, Decimal))
+        Mn, Sd = _UT.LogStat(Vz[:,J])
+        self.Eng['Vz'][float(z)] = (_Round(Mn, 'Vz'),
+                                    _Round(Sd, 'Vz'))
 
   #---------------------------------------------------------------------------------------
 
@@ -264,24 +412,22 @@ class Site1D(object):
 
   #---------------------------------------------------------------------------------------
 
-  def ComputeQWL(self, Key='Vs'):
+  def ComputeQWL(self, Key='Vs', Method='Exact'):
     """
     Compute quarter-wavelength parameters and store
-    them into the site database
+    them into the site database.
+    Method can be 'Exact' (closed-form solution, all models
+    at once) or 'Approx' (iterative search, one model at a time).
     """
 
-    for M in self.Mod:
+    if not self.Mod:
+      return
 
-      # Compute average velocity
-      Qwl = _SM.QwlApproxSolver(M.Par['Hl'],
-                                M.Par[Key],
-                                M.Par['Dn'],
-                                self.Freq)
+    Qwl = _Cached('Qwl' + Method, self.Mod, [Key, 'Dn'],
+                  (_np.array(self.Freq, dtype='float'),),
+                  lambda Hl, Vs, Dn: _QwlSolver(Hl, Vs, Dn, self.Freq, Method))
 
-      M.Eng['Qwl'] = {}
-      M.Eng['Qwl']['Hl'] = _UT.Round(Qwl[0], Decimal)
-      M.Eng['Qwl'][Key] = _UT.Round(Qwl[1], Decimal)
-      M.Eng['Qwl']['Dn'] = _UT.Round(Qwl[2], Decimal)
+    _StoreQWL(self.Mod, Key, Qwl)
 
   #---------------------------------------------------------------------------------------
 
@@ -301,49 +447,44 @@ class Site1D(object):
                              M.Eng['Qwl']['Dn'],
                              Vref, Dref)
 
-      M.Amp['Imp'] = _UT.Round(Amp, Decimal)
+      M.Amp['Imp'] = _Round(Amp, 'Imp')
 
   #---------------------------------------------------------------------------------------
 
-  def ComputeSHTF(self, Iang=0., Elastic=False):
+  def ComputeSHTF(self, Iang=0., Elastic=False, Adaptive=False):
     """
     Compute the SH transfer function for an arbitrary incidence angle.
     Default incidence is vertical.
+    With Adaptive, the function is computed on few adaptive samples,
+    refined around the resonances, and interpolated on the site
+    frequency axis (see SiteMethods.AdaptiveShTransferFunction).
     """
 
-    for M in self.Mod:
+    if not self.Mod:
+      return
 
-      # TF calculation
-      Shtf = _SM.ShTransferFunction(M.Par['Hl'],
-                                    M.Par['Vs'],
-                                    M.Par['Dn'],
-                                    M.Par['Qs'],
-                                    self.Freq,
-                                    Iang, Elastic)
+    # TF calculation (all models at once)
+    Shtf = _Cached('Stf', self.Mod, ['Vs','Dn','Qs'],
+                   (_np.array(self.Freq, dtype='float'), float(Iang), bool(Elastic),
+                    bool(Adaptive)),
+                   lambda Hl, Vs, Dn, Qs: (_ShtfSolver(Hl, Vs, Dn, Qs, self.Freq,
+                                                       Iang, Elastic, Adaptive),))
 
-      M.Amp['Stf'] = Shtf
+    for I, M in enumerate(self.Mod):
+      M.Amp['Stf'] = Shtf[I][0]
 
   #---------------------------------------------------------------------------------------
 
-  def ComputeFnRes(self):
+  def ComputeFnRes(self, Refine=False, Prominence=0.):
     """
     Identify resonance frequencies of the SH-wave transfer function.
+    Peaks of all models are searched at once (see SiteMethods.GetResFreq).
     """
 
-    for M in self.Mod:
+    if not self.Mod:
+      return
 
-      try:
-        Shtf = M.Amp['Stf']
-      except:
-        print 'Warning: Transfer Function not found'
-        return
-
-      # Get frequencies
-      Fn, An = _SM.GetResFreq(self.Freq, Shtf)
-
-      M.Amp['Res'] = {}
-      M.Amp['Res']['Fn'] = _UT.Round(Fn, Decimal)
-      M.Amp['Res']['An'] = _UT.Round(An, Decimal)
+    _StoreRes(self.Mod, self.Freq, Refine, Prominence)
 
   #---------------------------------------------------------------------------------------
 
@@ -354,15 +495,19 @@ class Site1D(object):
     Multiple depths are not supported.
     """
 
-    for M in self.Mod:
+    if not self.Mod:
+      return
+
+    # Whole profile depth (before padding)
+    if _UT.IsEmpty(Z):
+      Z = [_np.sum(M.Par['Hl']) for M in self.Mod]
 
-      # Compute kappa attenuation
-      K0 = _SM.Kappa0(M.Par['Hl'],
-                      M.Par[Key[0]],
-                      M.Par[Key[1]],
-                      Z)
+    # Compute kappa attenuation
+    Hl, Vs, Qs = self.Stack(Key)
+    K0 = _SM.Kappa0(Hl, Vs, Qs, Z)
 
-      M.Eng['K0'] = _UT.Round(K0, Decimal)
+    for I, M in enumerate(self.Mod):
+      M.Eng['K0'] = _Round(K0[I], 'K0')
 
   #---------------------------------------------------------------------------------------
 
@@ -382,7 +527,143 @@ class Site1D(object):
       # Compute exponential decay function
       Attf = _SM.AttenuationDecay(self.Freq, Kappa0)
 
-      M.Amp['Att'] = _UT.Round(Attf, Decimal)
+      M.Amp['Att'] = _Round(Attf, 'Att')
+
+  #---------------------------------------------------------------------------------------
+
+  def ComputeRvtAmp(self, Fas, Periods, Duration, Damping=0.05, Key='Stf'):
+    """
+    Compute the response spectral amplification (random vibration
+    theory) of a reference Fourier amplitude spectrum Fas, given on
+    the site frequency axis. The site term is either the SH-wave
+    transfer function (Key='Stf') or the product of impedance
+    amplification and attenuation function (Key='Imp').
+    """
+
+    if not self.Mod:
+      return
+
+    try:
+      if Key == 'Stf':
+        Amp = _np.array([_np.abs(_np.ravel(M.Amp['Stf'])) for M in self.Mod])
+      else:
+        Amp = _np.array([_np.ravel(M.Amp['Imp'])*_np.ravel(M.Amp['Att'])
+                         for M in self.Mod])
+      Amp = Amp.reshape(len(self.Mod), len(self.Freq))
+    except:
+      print 'Warning: Amplification function not found'
+      return
+
+    # Amplification of all models at once
+    Rsa = _RM.RvtAmplification(self.Freq, Fas, Amp, Periods, Duration, Damping)
+
+    for I, M in enumerate(self.Mod):
+      M.Amp['Rsa'] = {}
+      M.Amp['Rsa']['Per'] = _np.array(Periods, dtype='float')
+      M.Amp['Rsa']['Amp'] = _Round(Rsa[I], 'Rsa')
+
+  #---------------------------------------------------------------------------------------
+
+  def ComputeEQL(self, Acc, Dt, Strain, GGmax, Damp, Ratio=0.65,
+                                                     Tol=0.02,
+                                                     MaxIter=15,
+                                                     Iang=0.):
+    """
+    Equivalent-linear response of all site models to an outcrop
+    acceleration time history (see EqlMethods.EqlSolver).
+    Modulus reduction and damping curves (%) are either common to all
+    layers or given per layer on the stack of models (see Stack).
+    The transfer function is interpolated on the site frequency axis;
+    strain-compatible Vs, Qs and effective strains (%) are stored
+    in Eng['Eql'].
+    """
+
+    if not self.Mod:
+      return
+
+    Hl, Vs, Dn, Qs = self.Stack(['Vs','Dn','Qs'])
+
+    Freq, Tf, VsE, QsE, Gam, Iter = _EM.EqlSolver(Hl, Vs, Dn, Qs, Acc, Dt,
+                                                  Strain, GGmax, Damp,
+                                                  Ratio, Tol, MaxIter, Iang)
+
+    for I, M in enumerate(self.Mod):
+
+      N = M.LayNum
+      Re = _np.interp(self.Freq, Freq, Tf[I].real)
+      Im = _np.interp(self.Freq, Freq, Tf[I].imag)
+
+      M.Amp['Eql'] = (Re + 1j*Im)[:,None]
+      M.Eng['Eql'] = {'Vs': _Round(VsE[I,:N], 'Eql'),
+                      'Qs': _Round(QsE[I,:N], 'Eql'),
+                      'Gam': Gam[I,:N],
+                      'Iter': int(Iter[I])}
+
+  #---------------------------------------------------------------------------------------
+
+  def RandomProfiles(self, Num, Index=0, ChunkSize=1000, Seed=None, **Kw):
+    """
+    Generator of random realisations of a site model, as chunks
+    of packed arrays (Hl, Vs, Dn, Qs), see RandomMethods.RandomChunks.
+    No Model object is created.
+    """
+
+    P = self.Mod[Index].Par
+
+    return _RA.RandomChunks(P['Hl'], P['Vs'], P['Dn'], P['Qs'],
+                            Num, ChunkSize, Seed, **Kw)
+
+  #---------------------------------------------------------------------------------------
+
+  def ComputeRandom(self, Num, Index=0, Z=[30.], Steps=['Vz','Qwl','Stf'],
+                                                 Iang=0.,
+                                                 ChunkSize=1000,
+                                                 Seed=None,
+                                                 **Kw):
+    """
+    Compute the log-normal statistics (median and log-standard
+    deviation factor) of travel-time average velocities (Vz),
+    quarter-wavelength velocity (Qwl) and SH-wave transfer function
+    amplitude (Stf) over Num random realisations of a site model.
+    Realisations are processed in chunks; results are stored into
+    the site Eng['Rnd'] dictionary.
+    """
+
+    if type(Z) != list:
+      Z = [Z]
+
+    Sum = {}
+
+    for Hl, Vs, Dn, Qs in self.RandomProfiles(Num, Index, ChunkSize, Seed, **Kw):
+
+      Res = {}
+      if 'Vz' in Steps:
+        Res['Vz'] = _SM.TTAverageVelocity(Hl, Vs, Z)
+      if 'Qwl' in Steps:
+        Res['Qwl'] = _SM.QwlExactSolver(Hl, Vs, Dn, self.Freq)[1]
+      if 'Stf' in Steps:
+        Res['Stf'] = _np.abs(_SM.ShTransferFunction(Hl, Vs, Dn, Qs,
+                                                    self.Freq, Iang)[...,0])
+
+      # Sums of log-values and squares
+      for K, R in Res.items():
+        L = _np.log(R)
+        S = Sum.setdefault(K, [0., 0.])
+        S[0] = S[0] + _np.sum(L, axis=0)
+        S[1] = S[1] + _np.sum(L**2, axis=0)
+
+    self.Eng['Rnd'] = {}
+
+    for K, (S1, S2) in Sum.items():
+      Mn = S1/Num
+      Sd = _np.sqrt(_np.maximum(S2/Num - Mn**2, 0.))
+
+      if K == 'Vz':
+        self.Eng['Rnd'][K] = dict((float(z), (_Round(_np.exp(Mn[J]), 'Rnd'),
+                                              _Round(_np.exp(Sd[J]), 'Rnd')))
+                                  for J, z in enumerate(Z))
+      else:
+        self.Eng['Rnd'][K] = (_np.exp(Mn), _np.exp(Sd))
 
 #-----------------------------------------------------------------------------------------
 
@@ -400,6 +681,9 @@ class SiteDb(object):
 
     self.Site = []
 
+    # Contiguous layer storage (see Pack)
+    self.Store = None
+
   #---------------------------------------------------------------------------------------
 
   def AddSite(self, Index=-1, Site=[]):
@@ -414,39 +698,614 @@ class SiteDb(object):
     else:
       self.Site.insert(Index, Site1D())
 
+    self.Store = None
+
   #---------------------------------------------------------------------------------------
 
-  def ImportSites(self, AsciiFile, Root='', FileType=''):
+  def ImportSites(self, AsciiFile, Root='', FileType='',
+                                     Header=['Id','X','Y','Z','File'],
+                                     SkipLine=0,
+                                     Workers=1,
+                                     Process=False):
     """
     Import multiple site models from a csv list with format:
-    'Id','X','Y','Z','File'
+    'Id','X','Y','Z','File' (a different column order can be
+    given as header, empty keys are ignored).
+
+    Profile files are read only once, even if shared by several
+    sites, using a pool of threads (or of processes) of the
+    given size. Files that cannot be read are reported and the
+    corresponding sites are skipped. Output is a list of the
+    failures as (Id, File, Error) tuples.
     """
 
+    DType = ['string' if H in ['Id','File'] else 'float' for H in Header]
+
     Table = _AT.AsciiTable()
-    Table.Import(AsciiFile, header=['Id','X','Y','Z','File'],
-                            dtype=['string','float','float','float','string'],
-                            delimiter=',', 
-                            skipline=0,
+    Table.Import(AsciiFile, header=Header,
+                            dtype=DType,
+                            delimiter=',',
+                            skipline=SkipLine,
                             comment='#')
 
-    for D in Table.data:
-      S = Site1D(Table.data['Id'],
-                 Table.data['X'],
-                 Table.data['Y'],
-                 Table.data['Z'])
+    return self.AddSites(Table.data, Root, FileType, Workers, Process)
+
+  #---------------------------------------------------------------------------------------
+
+  def AddSites(self, Data, Root='', FileType='', Workers=1, Process=False):
+    """
+    Add multiple sites from a list of dictionaries with keys
+    'Id','X','Y','Z','File' (see ImportSites).
+    """
+
+    # Unique profile files (original order)
+    File = []
+    Seen = set()
+    for D in Data:
+      if D['File'] not in Seen:
+        File.append(D['File'])
+        Seen.add(D['File'])
+
+    Task = [(Root + F, FileType) for F in File]
+
+    # Parsing files
+    if Workers > 1:
+      Pool = _mp.Pool(Workers) if Process else _mpp.ThreadPool(Workers)
+      try:
+        Parsed = Pool.map(_ParseModel, Task)
+      finally:
+        Pool.close()
+        Pool.join()
+    else:
+      Parsed = [_ParseModel(T) for T in Task]
+
+    Parsed = dict(zip(File, Parsed))
+
+    # Contiguous storage of all site layers
+    Site = [D for D in Data if Parsed[D['File']][0] is not None]
+    Prof = [Parsed[D['File']][0] for D in Site]
+    Layer = _np.concatenate(Prof + [_np.zeros((0,len(Model.ParKeys)))])
+
+    Off = 0
+    for D, L in zip(Site, Prof):
+      S = Site1D(D['Id'], D['X'], D['Y'], D['Z'])
+
+      M = Model()
+      M.Buf = Layer[Off:Off+len(L)]
+      M.LayNum = len(L)
+      Off += len(L)
+
+      S.AddModel(Mod=M)
+      self.Site.append(S)
+
+    self.Store = None
+
+    # Reporting failures
+    Fail = []
+    for D in Data:
+      Error = Parsed[D['File']][1]
+      if Error:
+        print 'Warning: cannot import {0} ({1})'.format(D['File'], Error)
+        Fail.append((D['Id'], D['File'], Error))
+
+    return Fail
+
+  #---------------------------------------------------------------------------------------
+
+  def Pack(self):
+    """
+    Move the layers of all models of all sites into a single
+    contiguous array (one layer per row, ParKeys columns), indexed
+    by the offset and number of layers of each model and by the
+    offset and number of models of each site.
+    Site models become views of the packed array, which is used
+    directly by the database computations.
+    """
+
+    Mod = [M for S in self.Site for M in S.Mod]
+
+    ModNum = _np.array([len(S.Mod) for S in self.Site], dtype='int')
+    ModOff = _np.cumsum(ModNum) - ModNum
+
+    LayNum = _np.array([M.LayNum for M in Mod], dtype='int')
+    LayOff = _np.cumsum(LayNum) - LayNum
+
+    Layer = _np.zeros((_np.sum(LayNum), len(Model.ParKeys)))
+
+    for M, O, N in zip(Mod, LayOff, LayNum):
+      Layer[O:O+N] = M.Data
+      M.Buf = Layer[O:O+N]
+
+    self.Store = {'Layer': Layer,
+                  'LayOff': LayOff,
+                  'LayNum': LayNum,
+                  'ModOff': ModOff,
+                  'ModNum': ModNum}
+
+  #---------------------------------------------------------------------------------------
+
+  def CheckStore(self):
+    """
+    Verify that the packed storage is consistent with the site
+    models (e.g. after adding or removing layers) and pack again
+    the database if needed. Output is the list of all models.
+    """
+
+    Mod = [M for S in self.Site for M in S.Mod]
+
+    if self.Store is None:
+      self.Pack()
+
+    else:
+      Layer = self.Store['Layer']
+
+      ModNum = [len(S.Mod) for S in self.Site]
+      LayNum = [M.LayNum for M in Mod]
 
-      S.ImportModel(Root + Table.data['File'], FileType=FileType)
-      self.AddSite(Site=S)
+      if (not _np.array_equal(ModNum, self.Store['ModNum']) or
+          not _np.array_equal(LayNum, self.Store['LayNum']) or
+          not all(M.Buf.base is Layer for M in Mod)):
+        self.Pack()
+
+    return Mod
 
   #---------------------------------------------------------------------------------------
 
-  def ComputeTTAV(self, Key='Vs', Z=30., Average=True):
+  def Stack(self, Keys, Index=[]):
+    """
+    Return the layer properties of the models of all sites (or of the
+    sites at the given indexes) as 2D arrays of shape (nmodel, nlayer),
+    padded to equal layer number. Thickness is always returned first.
+    """
+
+    self.CheckStore()
+
+    Cols = [Model.ParKeys.index(K) for K in ['Hl'] + list(Keys)]
+
+    # Selecting models of the given sites
+    Sel = _np.arange(len(self.Store['LayNum']))
+    if not _UT.IsEmpty(Index):
+      Sel = [Sel[O:O+N] for O, N in zip(self.Store['ModOff'][Index],
+                                         self.Store['ModNum'][Index])]
+      Sel = _np.concatenate(Sel + [_np.array([], dtype='int')])
+
+    Data = _SM.PadRagged(self.Store['Layer'][:,Cols],
+                         self.Store['LayOff'][Sel],
+                         self.Store['LayNum'][Sel])
+
+    return tuple(Data[:,:,I] for I in range(len(Cols)))
+
+  #---------------------------------------------------------------------------------------
+
+  def FrequencyAxis(self, Fmin=0.1, Fmax=100., Fnum=1000, Log=True):
+    """
+    Method to generate the same lin/log spaced frequency axis
+    for all sites in the database.
+    """
+
+    for S in self.Site:
+      S.FrequencyAxis(Fmin, Fmax, Fnum, Log)
+
+  #---------------------------------------------------------------------------------------
+
+  def ComputeTTAV(self, Key='Vs', Z=30., Average=True, Workers=1, ChunkSize=100):
     """
     Compute average velocities for all sites in the database.
+    Computation can be distributed over a pool of processes (Workers),
+    each handling chunks of ChunkSize sites.
+    """
+
+    if Workers > 1:
+      self._Parallel('ComputeTTAV', (Key, Z, Average), Workers, ChunkSize)
+      return
+
+    if type(Z) != list:
+      Z = [Z]
+
+    Mod = self.CheckStore()
+
+    if not Mod:
+      return
+
+    # Compute average velocity (all models and depths)
+    Hl, Vs = self.Stack([Key])
+    Vz = _SM.TTAverageVelocity(Hl, Vs, Z)
+
+    for S, O, N in zip(self.Site, self.Store['ModOff'], self.Store['ModNum']):
+      if N:
+        S._StoreTTAV(S.Mod, Z, Vz[O:O+N], Average)
+
+  #---------------------------------------------------------------------------------------
+
+  def ComputeGTClass(self, BCode='EC8', Workers=1, ChunkSize=100):
+    """
+    Compute geotechnical classification for all sites in the database.
+    """
+
+    if Workers > 1:
+      self._Parallel('ComputeGTClass', (BCode,), Workers, ChunkSize)
+      return
+
+    for S in self.Site:
+      S.ComputeGTClass(BCode)
+
+  #---------------------------------------------------------------------------------------
+
+  def ComputeQWL(self, Key='Vs', Method='Exact', Workers=1, ChunkSize=100):
+    """
+    Compute quarter-wavelength parameters for all sites in the database.
+    With the exact method, models of sites sharing the same frequency
+    axis are processed together in a single vectorized call.
+    """
+
+    if Workers > 1:
+      self._Parallel('ComputeQWL', (Key, Method), Workers, ChunkSize)
+      return
+
+    if Method != 'Exact':
+      for S in self.Site:
+        S.ComputeQWL(Key, Method)
+      return
+
+    self.CheckStore()
+
+    for Freq, Index in self.FreqGroups():
+
+      Mod = [M for I in Index for M in self.Site[I].Mod]
+
+      if not Mod:
+        continue
+
+      Qwl = _Cached('QwlExact', Mod, [Key, 'Dn'], (Freq,),
+                    lambda Hl, Vs, Dn: _SM.QwlExactSolver(Hl, Vs, Dn, Freq),
+                    lambda: self.Stack([Key, 'Dn'], Index))
+
+      _StoreQWL(Mod, Key, Qwl)
+
+  #---------------------------------------------------------------------------------------
+
+  def ComputeImpAmp(self, Key='Vs', Vref=[], Dref=[], Workers=1, ChunkSize=100):
     """
+    Compute the impedance amplification for all sites in the database.
+    """
+
+    if Workers > 1:
+      self._Parallel('ComputeImpAmp', (Key, Vref, Dref), Workers, ChunkSize)
+      return
 
     for S in self.Site:
-      S.ComputeTTAV(Key=Key, Z=Z)
+      S.ComputeImpAmp(Key, Vref, Dref)
+
+  #---------------------------------------------------------------------------------------
+
+  def ComputeSHTF(self, Iang=0., Elastic=False, Adaptive=False,
+                        Workers=1, ChunkSize=100):
+    """
+    Compute the SH transfer function of all the sites in the database.
+    Models of sites sharing the same frequency axis are processed
+    together in a single vectorized call.
+    """
+
+    if Workers > 1:
+      self._Parallel('ComputeSHTF', (Iang, Elastic, Adaptive), Workers, ChunkSize)
+      return
+
+    self.CheckStore()
+
+    for Freq, Index in self.FreqGroups():
+
+      Mod = [M for I in Index for M in self.Site[I].Mod]
+
+      if not Mod:
+        continue
+
+      # TF calculation
+      Shtf = _Cached('Stf', Mod, ['Vs','Dn','Qs'],
+                     (Freq, float(Iang), bool(Elastic), bool(Adaptive)),
+                     lambda Hl, Vs, Dn, Qs: (_ShtfSolver(Hl, Vs, Dn, Qs, Freq,
+                                                         Iang, Elastic, Adaptive),),
+                     lambda: self.Stack(['Vs','Dn','Qs'], Index))
+
+      for I, M in enumerate(Mod):
+        M.Amp['Stf'] = Shtf[I][0]
+
+  #---------------------------------------------------------------------------------------
+
+  def ComputeFnRes(self, Refine=False, Prominence=0., Workers=1, ChunkSize=100):
+    """
+    Identify resonance frequencies for all sites in the database.
+    Models of sites sharing the same frequency axis are processed
+    together.
+    """
+
+    if Workers > 1:
+      self._Parallel('ComputeFnRes', (Refine, Prominence), Workers, ChunkSize)
+      return
+
+    for Freq, Index in self.FreqGroups():
+
+      Mod = [M for I in Index for M in self.Site[I].Mod]
+
+      if Mod:
+        _StoreRes(Mod, Freq, Refine, Prominence)
+
+  #---------------------------------------------------------------------------------------
+
+  def ComputeKappa(self, Key=('Vs','Qs'), Z=[], Workers=1, ChunkSize=100):
+    """
+    Compute the Kappa parameter for all sites in the database.
+    """
+
+    if Workers > 1:
+      self._Parallel('ComputeKappa', (Key, Z), Workers, ChunkSize)
+      return
+
+    Mod = self.CheckStore()
+
+    if not Mod:
+      return
+
+    # Whole profile depth (before padding)
+    if _UT.IsEmpty(Z):
+      Z = [_np.sum(M.Par['Hl']) for M in Mod]
+
+    Hl, Vs, Qs = self.Stack(Key)
+    K0 = _SM.Kappa0(Hl, Vs, Qs, Z)
+
+    for I, M in enumerate(Mod):
+      M.Eng['K0'] = _Round(K0[I], 'K0')
+
+  #---------------------------------------------------------------------------------------
+
+  def ComputeAttFun(self, Workers=1, ChunkSize=100):
+    """
+    Compute the attenuation function for all sites in the database.
+    """
+
+    if Workers > 1:
+      self._Parallel('ComputeAttFun', (), Workers, ChunkSize)
+      return
+
+    for S in self.Site:
+      S.ComputeAttFun()
+
+  #---------------------------------------------------------------------------------------
+
+  def ComputeRvtAmp(self, Fas, Periods, Duration, Damping=0.05, Key='Stf',
+                          Workers=1, ChunkSize=100):
+    """
+    Compute the response spectral amplification for all sites
+    in the database (see Site1D.ComputeRvtAmp).
+    """
+
+    if Workers > 1:
+      self._Parallel('ComputeRvtAmp', (Fas, Periods, Duration, Damping, Key),
+                     Workers, ChunkSize)
+      return
+
+    for S in self.Site:
+      S.ComputeRvtAmp(Fas, Periods, Duration, Damping, Key)
+
+  #---------------------------------------------------------------------------------------
+
+  def _Parallel(self, Method, Args, Workers, ChunkSize):
+    """
+    Private method to run a database computation over a pool
+    of processes. Sites are split in chunks, processed separately
+    and collected back in the original order. Only the inputs of
+    the computation (layers, frequencies and required results) are
+    sent to the workers; new results are merged into the sites.
+    """
+
+    ChunkSize = max(int(ChunkSize), 1)
+
+    EngKeys, AmpKeys = _ParallelInput.get(Method, ([], []))
+    Light = [_LightSite(S, EngKeys, AmpKeys) for S in self.Site]
+
+    Task = [(Method, Args, Light[I:I+ChunkSize])
+            for I in range(0, len(Light), ChunkSize)]
+
+    Pool = _mp.Pool(Workers)
+
+    try:
+      Chunk = Pool.map(_ChunkCall, Task)
+    finally:
+      Pool.close()
+      Pool.join()
+
+    # Merging results into the original sites
+    for S, (Eng, Mod) in zip(self.Site, [R for C in Chunk for R in C]):
+      S.Eng.update(Eng)
+      for M, (MEng, MAmp) in zip(S.Mod, Mod):
+        M.Eng.update(MEng)
+        M.Amp.update(MAmp)
+
+  #---------------------------------------------------------------------------------------
+
+  def FreqGroups(self):
+    """
+    Group sites of the database by identical frequency axis.
+    Output is a list of (Freq, [site indexes]) tuples.
+    """
+
+    Groups = {}
+    Order = []
+
+    for I, S in enumerate(self.Site):
+      Freq = _np.array(S.Freq, dtype='float')
+      Key = (Freq.size, Freq.tostring())
+
+      if Key not in Groups:
+        Groups[Key] = (Freq, [])
+        Order.append(Key)
+
+      Groups[Key][1].append(I)
+
+    return [Groups[K] for K in Order]
+
+  #---------------------------------------------------------------------------------------
+
+  def Save(self, DbFile):
+    """
+    Save the database into a binary file: site headers, frequency
+    axes, layer properties, engineering parameters (Vz, K0, Gc, Qwl)
+    and amplification functions (Stf, Imp, Att, Res).
+    The file can be loaded back (memory-mapped) using Load.
+    """
+
+    Mod = self.CheckStore()
+    Block = dict(self.Store)
+
+    # Site coordinates and frequency axes
+    Block['Coord'] = _np.array([[_NanCheck(S.Hdr[K]) for K in ['X','Y','Z']]
+                                for S in self.Site]).reshape(-1,3)
+
+    Freq = [_np.array(S.Freq, dtype='float').ravel() for S in self.Site]
+    Block['FrqNum'] = _np.array([len(F) for F in Freq], dtype='int')
+    Block['Freq'] = _np.concatenate(Freq + [_np.zeros(0)])
+
+    # Scalar parameters of the models
+    Block['K0'] = _np.array([_NanCheck(M.Eng['K0']) for M in Mod])
+    Block['Gc'] = _np.array([M.Eng['Gc'] or '' for M in Mod], dtype='S4')
+
+    # Average velocities (all depths)
+    Depth = sorted(set(float(Z) for M in Mod if M.Eng['Vz'] for Z in M.Eng['Vz']) |
+                   set(float(Z) for S in self.Site if 'Vz' in S.Eng for Z in S.Eng['Vz']))
+
+    Block['Vz'] = _np.zeros((len(Mod), len(Depth)))
+    Block['Vz'][:] = _np.nan
+    for I, M in enumerate(Mod):
+      for Z, V in (M.Eng['Vz'] or {}).items():
+        Block['Vz'][I,Depth.index(float(Z))] = V
+
+    Block['SiteVz'] = _np.zeros((len(self.Site), len(Depth), 2))
+    Block['SiteVz'][:] = _np.nan
+    for I, S in enumerate(self.Site):
+      for Z, V in S.Eng.get('Vz', {}).items():
+        Block['SiteVz'][I,Depth.index(float(Z))] = V
+
+    # Frequency-dependent curves (on the site frequency axis)
+    CrvNum = _np.repeat(Block['FrqNum'], self.Store['ModNum'])
+    CrvOff = _np.cumsum(CrvNum) - CrvNum
+
+    Curve = [('Amp', K) for K in ['Stf','Imp','Att']]
+    Curve += sorted(set(('Qwl', K) for M in Mod if M.Eng['Qwl'] for K in M.Eng['Qwl']))
+    Block['CrvFlag'] = _np.zeros((len(Mod), len(Curve)), dtype='int8')
+
+    for J, (G, K) in enumerate(Curve):
+      Cmp = (K == 'Stf')
+      Data = _np.zeros(_np.sum(CrvNum), dtype='complex' if Cmp else 'float')
+      Data[:] = _np.nan
+
+      for I, M in enumerate(Mod):
+        V = M.Amp[K] if G == 'Amp' else M.Eng['Qwl']
+        V = V[K] if G == 'Qwl' else V
+        if _np.size(V) and _np.size(V) == CrvNum[I]:
+          Data[CrvOff[I]:CrvOff[I]+CrvNum[I]] = _np.ravel(V)
+          Block['CrvFlag'][I,J] = 1
+
+      Block[G + K] = Data
+
+    # Resonance frequencies (-1 if not computed)
+    Res = [M.Amp['Res'] or {'Fn': [], 'An': []} for M in Mod]
+    Block['ResNum'] = _np.array([len(R['Fn']) if M.Amp['Res'] else -1
+                                 for M, R in zip(Mod, Res)], dtype='int')
+    Block['ResFn'] = _np.concatenate([_np.ravel(R['Fn']) for R in Res] + [_np.zeros(0)])
+    Block['ResAn'] = _np.concatenate([_np.ravel(R['An']) for R in Res] + [_np.zeros(0)])
+
+    Meta = {'Id': self.Hdr['Id'],
+            'Info': self.Hdr['Info'],
+            'SiteId': [S.Hdr['Id'] for S in self.Site],
+            'Depth': Depth,
+            'Curve': Curve}
+
+    _BT.Write(DbFile, Block, Meta)
+
+  #---------------------------------------------------------------------------------------
+
+  def Load(self, DbFile, MemMap=True):
+    """
+    Load the database from a binary file (see Save), replacing the
+    current content. With MemMap, layer properties and curves are
+    memory-mapped, therefore read from disk only when accessed.
+    """
+
+    Block, Meta = _BT.Read(DbFile, MemMap)
+
+    self.Hdr['Id'] = Meta['Id']
+    self.Hdr['Info'] = Meta['Info']
+    self.Site = []
+
+    Depth = Meta['Depth']
+    Curve = [tuple(str(K) for K in C) for C in Meta['Curve']]
+    Flag = _np.array(Block['CrvFlag'])
+
+    FrqNum = Block['FrqNum']
+    FrqOff = _np.cumsum(FrqNum) - FrqNum
+    CrvNum = _np.repeat(FrqNum, Block['ModNum'])
+    CrvOff = _np.cumsum(CrvNum) - CrvNum
+    ResNum = _np.maximum(Block['ResNum'], 0)
+    ResOff = _np.cumsum(ResNum) - ResNum
+
+    Mod = []
+
+    for I, Id in enumerate(Meta['SiteId']):
+
+      X, Y, Z = [_UT.NoneCheck(C) for C in Block['Coord'][I].tolist()]
+      S = Site1D(Id, [] if X is None else X,
+                     [] if Y is None else Y,
+                     [] if Z is None else Z)
+
+      if FrqNum[I]:
+        S.Freq = Block['Freq'][FrqOff[I]:FrqOff[I]+FrqNum[I]]
+
+      Vz = Block['SiteVz'][I]
+      if _np.any(_np.isfinite(Vz)):
+        S.Eng['Vz'] = dict((D, tuple(V)) for D, V in zip(Depth, Vz.tolist())
+                                         if V[0] == V[0])
+
+      for N in range(Block['ModNum'][I]):
+        S.AddModel(Mod=Model())
+        Mod.append(S.Mod[-1])
+
+      self.Site.append(S)
+
+    for I, M in enumerate(Mod):
+
+      # Layers (views of the packed storage)
+      Off, Num = Block['LayOff'][I], Block['LayNum'][I]
+      M.Buf = Block['Layer'][Off:Off+Num]
+      M.LayNum = Num
+
+      # Scalar parameters
+      if Block['K0'][I] == Block['K0'][I]:
+        M.Eng['K0'] = float(Block['K0'][I])
+      if Block['Gc'][I]:
+        M.Eng['Gc'] = str(Block['Gc'][I].decode('ascii'))
+
+      Vz = Block['Vz'][I].tolist()
+      if any(V == V for V in Vz):
+        M.Eng['Vz'] = dict((D, V) for D, V in zip(Depth, Vz) if V == V)
+
+      # Curves
+      for J, (G, K) in enumerate(Curve):
+        if Flag[I,J]:
+          V = Block[G + K][CrvOff[I]:CrvOff[I]+CrvNum[I]]
+          if G == 'Qwl':
+            if not M.Eng['Qwl']: M.Eng['Qwl'] = {}
+            M.Eng['Qwl'][K] = V
+          else:
+            M.Amp[K] = V[:,None] if K == 'Stf' else V
+
+      # Resonances
+      if Block['ResNum'][I] >= 0:
+        Off, Num = ResOff[I], ResNum[I]
+        M.Amp['Res'] = {'Fn': Block['ResFn'][Off:Off+Num],
+                        'An': Block['ResAn'][Off:Off+Num]}
+
+    # Packed storage is taken from file
+    self.Store = dict((K, Block[K]) for K in ['Layer','LayOff','LayNum',
+                                              'ModOff','ModNum'])
 
   #---------------------------------------------------------------------------------------
 
@@ -457,3 +1316,250 @@ class SiteDb(object):
 
     return len(self.Site)
 
+# Results required by the database computations (Eng, Amp keys),
+# sent to the workers of parallel runs
+_ParallelInput = {'ComputeGTClass': (['Vz'], []),
+                  'ComputeImpAmp': (['Qwl'], []),
+                  'ComputeFnRes': ([], ['Stf']),
+                  'ComputeAttFun': (['K0'], []),
+                  'ComputeRvtAmp': ([], ['Stf','Imp','Att'])}
+
+#-----------------------------------------------------------------------------------------
+
+def _StoreQWL(Mod, Key, Qwl):
+  """
+  Private function to store quarter-wavelength parameters of site models.
+  """
+
+  for I, M in enumerate(Mod):
+
+    M.Eng['Qwl'] = {}
+    M.Eng['Qwl']['Hl'] = _Round(Qwl[I][0], 'Qwl')
+    M.Eng['Qwl'][Key] = _Round(Qwl[I][1], 'Qwl')
+    M.Eng['Qwl']['Dn'] = _Round(Qwl[I][2], 'Qwl')
+
+#-----------------------------------------------------------------------------------------
+
+def _StoreRes(Mod, Freq, Refine, Prominence):
+  """
+  Private function to identify and store the resonance frequencies
+  of the transfer functions of a list of models.
+  """
+
+  try:
+    Shtf = _np.array([_np.ravel(M.Amp['Stf']) for M in Mod])
+    Shtf = Shtf.reshape(len(Mod), len(Freq))
+  except:
+    print 'Warning: Transfer Function not found'
+    return
+
+  # Get frequencies
+  Fn, An = _SM.GetResFreq(Freq, Shtf, Refine, Prominence)
+
+  for I, M in enumerate(Mod):
+    M.Amp['Res'] = {}
+    M.Amp['Res']['Fn'] = _Round(Fn[I], 'Res')
+    M.Amp['Res']['An'] = _Round(An[I], 'Res')
+
+#-----------------------------------------------------------------------------------------
+
+def _Stack(Mod, Keys):
+  """
+  Private function to stack the layer properties of a list of models
+  into padded 2D arrays (thickness first, followed by the given keys).
+  """
+
+  Cols = [Model.ParKeys.index(K) for K in ['Hl'] + list(Keys)]
+
+  LayNum = _np.array([M.LayNum for M in Mod])
+  LayOff = _np.cumsum(LayNum) - LayNum
+
+  Data = _np.concatenate([M.Data[:,Cols] for M in Mod])
+  Data = _SM.PadRagged(Data, LayOff, LayNum)
+
+  return tuple(Data[:,:,I] for I in range(len(Cols)))
+
+#-----------------------------------------------------------------------------------------
+
+def _Cached(Tag, Mod, Keys, Extra, Func, Stack=None):
+  """
+  Private function to compute a result for each model of a list,
+  through the default result cache (CacheTools), if enabled.
+  Results are identified by the layer properties (Keys) of each
+  model and the additional parameters (Extra).
+
+  Func is called on the stacked profiles of the models to compute
+  and must return a tuple of arrays (models on the first axis).
+  Stack optionally provides the stacked profiles of all models,
+  used when the cache is disabled.
+  Output is a list of result tuples, one for each model.
+  """
+
+  Cache = _CT.Default
+
+  if Cache is None:
+    Res = Func(*(Stack() if Stack else _Stack(Mod, Keys)))
+    return [tuple(R[I] for R in Res) for I in range(len(Mod))]
+
+  Cols = [Model.ParKeys.index(K) for K in ['Hl'] + list(Keys)]
+
+  # Hash of each model
+  Base = Cache.Key(Tag, *Extra)
+  Hash = [Cache.Key(Base, M.Data[:,Cols]) for M in Mod]
+
+  # Search (duplicated models are searched once)
+  Out = {}
+  First = []
+  for I, H in enumerate(Hash):
+    if H not in Out:
+      Out[H] = Cache.Get(H)
+      First.append(I)
+    else:
+      Cache.Hits += 1
+
+  # Computing missing results
+  Miss = [I for I in First if Out[Hash[I]] is None]
+
+  if Miss:
+    Res = Func(*_Stack([Mod[I] for I in Miss], Keys))
+
+    for J, I in enumerate(Miss):
+      Out[Hash[I]] = tuple(R[J] for R in Res)
+      Cache.Put(Hash[I], Out[Hash[I]])
+
+  # Duplicated models get their own copy
+  First = set(First)
+
+  Res = []
+  for I, H in enumerate(Hash):
+    if I in First:
+      Res.append(Out[H])
+    else:
+      Res.append(tuple(_np.array(V) for V in Out[H]))
+
+  return Res
+
+#-----------------------------------------------------------------------------------------
+
+def _QwlSolver(Hl, Vs, Dn, Freq, Method='Exact'):
+  """
+  Private function to solve the quarter-wavelength problem for
+  a stack of profiles, using the exact or the approximated solver.
+  """
+
+  if Method == 'Exact':
+    return _SM.QwlExactSolver(Hl, Vs, Dn, Freq)
+
+  Sol = [_SM.QwlApproxSolver(H, V, D, Freq) for H, V, D in zip(Hl, Vs, Dn)]
+
+  return tuple(_np.array([S[I] for S in Sol]) for I in range(3))
+
+#-----------------------------------------------------------------------------------------
+
+def _ShtfSolver(Hl, Vs, Dn, Qs, Freq, Iang=0., Elastic=False, Adaptive=False):
+  """
+  Private function to compute the SH transfer function of a stack
+  of profiles, on the given frequency axis or on adaptive samples
+  interpolated on it.
+  """
+
+  if not Adaptive:
+    return _SM.ShTransferFunction(Hl, Vs, Dn, Qs, Freq, Iang, Elastic)
+
+  Freq = _np.array(Freq, dtype='float')
+
+  Fa, Ha = _SM.AdaptiveShTransferFunction(Hl, Vs, Dn, Qs, _np.min(Freq),
+                                                          _np.max(Freq),
+                                                          Iang=Iang,
+                                                          Elastic=Elastic)
+
+  return _SM.AdaptiveInterp(Fa, Ha, Freq)
+
+#-----------------------------------------------------------------------------------------
+
+def _LightSite(Site, EngKeys=[], AmpKeys=[]):
+  """
+  Private function to copy the inputs of a site computation:
+  layers, frequency axis and the given results of each model.
+  """
+
+  L = Site1D()
+  L.Hdr = dict(Site.Hdr)
+  L.Freq = Site.Freq
+
+  for M in Site.Mod:
+    N = Model()
+    N.Buf = M.Data
+    N.LayNum = M.LayNum
+
+    for K in EngKeys:
+      if K in M.Eng: N.Eng[K] = M.Eng[K]
+    for K in AmpKeys:
+      if K in M.Amp: N.Amp[K] = M.Amp[K]
+
+    L.Mod.append(N)
+
+  return L
+
+#-----------------------------------------------------------------------------------------
+
+def _ChunkCall(Task):
+  """
+  Private function to process a chunk of sites in a worker process.
+  Output is, for each site, the new site results and the new
+  results (Eng, Amp) of each model.
+  """
+
+  Method, Args, Site = Task
+
+  Old = [(dict(S.Eng), [(dict(M.Eng), dict(M.Amp)) for M in S.Mod]) for S in Site]
+
+  Db = SiteDb()
+  Db.Site = Site
+  getattr(Db, Method)(*Args)
+
+  def New(D, D0):
+    return dict((K, V) for K, V in D.items() if V is not D0.get(K))
+
+  return [(New(S.Eng, E), [(New(M.Eng, ME), New(M.Amp, MA))
+                           for M, (ME, MA) in zip(S.Mod, MO)])
+          for S, (E, MO) in zip(Site, Old)]
+
+#-----------------------------------------------------------------------------------------
+
+def _ParseModel(Task):
+  """
+  Private function to parse a single profile file.
+  Output is the layer array, or the error message on failure.
+  """
+
+  AsciiFile, FileType = Task
+
+  try:
+    S = Site1D()
+    S.ImportModel(AsciiFile, FileType=FileType)
+    return S.Mod[0].Data.copy(), ''
+
+  except Exception as E:
+    return None, str(E)
+
+#-----------------------------------------------------------------------------------------
+
+def _Round(Number, Key):
+  """
+  Private function to round a result to the precision of its type.
+  """
+
+  return _UT.Round(Number, Precision.get(Key, Decimal))
+
+#-----------------------------------------------------------------------------------------
+
+def _NanCheck(Number):
+  """
+  Private function to convert empty values to NaN.
+  """
+
+  Number = _UT.NoneCheck(Number)
+  Number = _np.nan if Number is None else float(Number)
+
+  return Number
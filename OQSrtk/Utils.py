@@ -56,16 +56,22 @@ def NoneCheck(Number):
 
 def Round(Number, Decimal=3):
   """
-  Round scalar and arrays to a given decimal place
+  Round scalar and arrays to a given decimal place.
+  Input is not modified: a rounded copy is returned (of the same
+  type for lists and tuples). If Decimal is None, the input
+  is returned at full precision.
   """
 
-  if isinstance(Number, (list, tuple, _np.ndarray)):
-    for I,N in enumerate(Number):
-      Number[I] = round(N, Decimal)
-  else:
-    Number = round(Number, Decimal)
+  if Decimal is None:
+    return Number
 
-  return Number
+  if isinstance(Number, _np.ndarray):
+    return _np.round(Number, Decimal)
+
+  if isinstance(Number, (list, tuple)):
+    return type(Number)(_np.round(_np.array(Number, dtype='float'), Decimal).tolist())
+
+  return round(Number, Decimal)
 
 #-----------------------------------------------------------------------------------------
 
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2010-2017 GEM Foundation
+#
+# The Site Response Toolkit (SRTK) is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# SRTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# with this download. If not, see <http://www.gnu.org/licenses/>
+#
+# Author: Poggi Valerio
+
+"""
+Synthetic input data shared by the tests and the benchmarks.
+"""
+
+import numpy as np
+
+#-----------------------------------------------------------------------------------------
+
+def Profiles(Models=50, Layers=8, Seed=0):
+  """
+  Random stack of soil profiles (Hl, Vs, Dn, Qs), shape (Models, Layers).
+  Velocities increase with depth, the last layer is the half-space.
+  """
+
+  R = np.random.RandomState(Seed)
+
+  Hl = R.uniform(1., 20., (Models, Layers))
+  Hl[:,-1] = 0.
+  Vs = np.sort(R.uniform(100., 1500., (Models, Layers)), axis=1)
+  Dn = R.uniform(1800., 2400., (Models, Layers))
+  Qs = R.uniform(10., 100., (Models, Layers))
+
+  return Hl, Vs, Dn, Qs
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2010-2017 GEM Foundation
+#
+# The Site Response Toolkit (SRTK) is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# SRTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# with this download. If not, see <http://www.gnu.org/licenses/>
+#
+# Author: Poggi Valerio
+
+"""
+Tests of the equivalent-linear methods.
+
+Usage (from the repository root):
+  python -m unittest discover -s Tests -p "Test*.py"
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import OQSrtk.SiteMethods as sm
+import OQSrtk.EqlMethods as em
+
+from Synthetic import Profiles
+
+#-----------------------------------------------------------------------------------------
+
+class TestShStrainFunction(unittest.TestCase):
+
+  def test_propagator(self):
+    # Surface response is the one of the SH transfer function
+    Hl, Vs, Dn, Qs = Profiles(5, 5)
+    Freq = np.linspace(0.1, 50., 200)
+
+    Htf, Gam = em.ShStrainFunction(Hl, Vs, Dn, Qs, Freq, 0.3)
+    Ref = sm.ShTransferFunction(Hl, Vs, Dn, Qs, Freq, 0.3)[...,0]
+
+    self.assertEqual(Gam.shape, Hl.shape + Freq.shape)
+    self.assertTrue(np.allclose(Htf, Ref))
+    self.assertTrue(np.all(Gam[:,-1] == 0.))
+
+  def test_causality(self):
+    # No strain before the arrival of a displacement pulse at 10 s
+    Hl, Vs, Dn, Qs = [X[0] for X in Profiles(5, 5)]
+
+    Dt, Nsmp = 0.01, 4096
+    Time = np.arange(Nsmp)*Dt
+    Freq = np.fft.rfftfreq(Nsmp, Dt)
+    Disp = np.fft.rfft(np.exp(-((Time - 10.)/0.1)**2))
+
+    Gtf = em.ShStrainFunction(Hl, Vs, Dn, Qs, Freq)[1]
+    Gt = em.StrainHistory(Gtf, Disp, Nsmp)
+
+    Pre = np.sum(Gt[:,Time < 9.5]**2)
+    Post = np.sum(Gt[:,Time >= 10.]**2)
+
+    self.assertGreater(Post, 0.)
+    self.assertLess(Pre/Post, 1e-6)
+
+#-----------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2010-2017 GEM Foundation
+#
+# The Site Response Toolkit (SRTK) is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# SRTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# with this download. If not, see <http://www.gnu.org/licenses/>
+#
+# Author: Poggi Valerio
+
+"""
+Tests of the instrumentation tools.
+
+Usage (from the repository root):
+  python -m unittest discover -s Tests -p "Test*.py"
+"""
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import OQSrtk.SiteModel as smo
+import OQSrtk.ProfileTools as pt
+
+DATA = os.path.join(ROOT, 'Demos', 'Data', '')
+
+#-----------------------------------------------------------------------------------------
+
+class TestSiteTiming(unittest.TestCase):
+
+  def tearDown(self):
+    pt.Disable()
+
+  def test_batch_sites(self):
+    # Threaded import: one record per database site (same Ids are
+    # kept apart), import time credited to the new sites
+    pt.Enable()
+
+    Db = smo.SiteDb()
+    Db.AddSites([{'Id': Id, 'X': 0., 'Y': 0., 'Z': 0., 'File': 'site01.csv'}
+                 for Id in ['a', 'a', 'b']], Root=DATA, Workers=2)
+    Db.FrequencyAxis(0.1, 10., 50)
+    Db.ComputeSHTF()
+
+    Rec = pt.Disable()
+
+    self.assertEqual([S['Id'] for S in Rec.Site], ['a', 'a', 'b'])
+
+    for S in Rec.Site:
+      self.assertIn('SiteDb.AddSites', S['Time'])
+      self.assertIn('SiteDb.ComputeSHTF', S['Time'])
+
+    # Time is attributed once
+    Site = sum(sum(S['Time'].values()) for S in Rec.Site)
+    Outer = Rec.Method['SiteDb.AddSites']['Time'] + \
+            Rec.Method['SiteDb.ComputeSHTF']['Time']
+    self.assertAlmostEqual(Site, Outer, places=9)
+
+  def test_restore(self):
+    # Original functions are restored
+    Func = smo._ParseModel
+    pt.Enable()
+    self.assertIsNot(smo._ParseModel, Func)
+    pt.Disable()
+    self.assertIs(smo._ParseModel, Func)
+
+#-----------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+  unittest.main()
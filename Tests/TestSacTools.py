@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2010-2017 GEM Foundation
+#
+# The Site Response Toolkit (SRTK) is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# SRTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# with this download. If not, see <http://www.gnu.org/licenses/>
+#
+# Author: Poggi Valerio
+
+"""
+Tests of the SAC file tools.
+
+Usage (from the repository root):
+  python -m unittest discover -s Tests -p "Test*.py"
+"""
+
+import os
+import sys
+import shutil
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import OQSrtk.SacTools as st
+
+DATA = os.path.join(ROOT, 'Demos', 'Data', '')
+
+#-----------------------------------------------------------------------------------------
+
+class TestSac(unittest.TestCase):
+
+  def setUp(self):
+    self.Dir = tempfile.mkdtemp()
+
+    self.Sac = st.Sac()
+    self.Sac.Head = {'DELTA': 0.01, 'B': 2.5, 'NZYEAR': 2013, 'NZJDAY': 180,
+                     'NZHOUR': 9, 'NZMIN': 11, 'NZSEC': 35, 'NZMSEC': 120,
+                     'KSTNM': 'STA01', 'KNETWK': 'XX', 'KCMPNM': 'HHZ',
+                     'KEVNM': 'EVENT-0001'}
+    self.Sac.Data = [np.sin(np.arange(500)/10.).astype('float32')]
+
+  def tearDown(self):
+    shutil.rmtree(self.Dir)
+
+  def test_layout(self):
+    # Fixed header layout (SAC version 6)
+    SacFile = os.path.join(self.Dir, 'a.sac')
+    self.Sac.Write(SacFile, '<')
+
+    with open(SacFile, 'rb') as f:
+      Buf = f.read()
+
+    self.assertEqual(len(Buf), 632 + 4*500)
+    self.assertAlmostEqual(struct.unpack('<f', Buf[0:4])[0], 0.01)
+    self.assertEqual(struct.unpack('<i', Buf[4*76:4*77])[0], 6)
+    self.assertEqual(struct.unpack('<i', Buf[4*79:4*80])[0], 500)
+    self.assertEqual(Buf[440:448], b'STA01   ')
+    self.assertEqual(Buf[448:464], b'EVENT-0001      ')
+    self.assertEqual(Buf[600:608], b'HHZ     ')
+
+  def test_round_trip(self):
+    # Both byte orders, with and without memory mapping
+    for Bo in ['<', '>']:
+      SacFile = os.path.join(self.Dir, 'b.sac')
+      self.Sac.Write(SacFile, Bo)
+
+      Head, Order = st.ReadHeader(SacFile)
+      self.assertEqual(Order, Bo)
+
+      for Memmap in [True, False]:
+        S = st.Sac(SacFile, Memmap)
+
+        for K, V in self.Sac.Head.items():
+          self.assertEqual(type(S.Head[K]), type(V))
+          if isinstance(V, float):
+            self.assertAlmostEqual(S.Head[K], V, places=6)
+          else:
+            self.assertEqual(S.Head[K], V)
+
+        self.assertEqual(S.Head['NPTS'], 500)
+        self.assertAlmostEqual(S.Head['E'], 2.5 + 499*0.01, places=4)
+        self.assertNotIn('USER0', S.Head)
+
+        self.assertEqual(len(S.Data), 1)
+        self.assertTrue(np.array_equal(S.Data[0], self.Sac.Data[0]))
+
+        del S
+
+  def test_read(self):
+    # Demo recording
+    S = st.Sac(DATA + 'CH.OTER2..EH2.D.2013.180.091135.SAC')
+
+    self.assertEqual(S.Head['KNETWK'], 'CH')
+    self.assertEqual(S.Head['KSTNM'], 'OTER2')
+    self.assertEqual(S.Head['KCMPNM'], 'EH2')
+    self.assertEqual(S.Data[0].size, S.Head['NPTS'])
+
+  def test_not_sac(self):
+    BadFile = os.path.join(self.Dir, 'c.sac')
+    with open(BadFile, 'wb') as f:
+      f.write(b'\0'*1000)
+
+    self.assertRaises(ValueError, st.Sac, BadFile)
+
+#-----------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2010-2017 GEM Foundation
+#
+# The Site Response Toolkit (SRTK) is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# SRTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# with this download. If not, see <http://www.gnu.org/licenses/>
+#
+# Author: Poggi Valerio
+
+"""
+Tests of the signal processing tools.
+
+Usage (from the repository root):
+  python -m unittest discover -s Tests -p "Test*.py"
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import scipy.signal as sig
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import OQSrtk.Signals as sg
+
+#-----------------------------------------------------------------------------------------
+
+class TestFilter(unittest.TestCase):
+
+  def test_freq_domain(self):
+    # Spectral filtering matches recursive filtering, for even
+    # and odd FFT lengths (2000 and 2025 samples)
+    for Nsmp in [1000, 1012]:
+      Data = np.random.RandomState(0).randn(3, Nsmp)
+      Data[:,0] = 0.
+
+      Rec = sg.Record()
+      Rec.HDR['TSMP'] = 0.01
+      Rec.AddChannel(Data)
+      Rec.Filter(1., 10., Domain='freq')
+
+      Sos = sig.butter(3, [2.*1./100., 2.*10./100.], btype='band', output='sos')
+      Ref = sig.sosfilt(Sos, Data, axis=-1)
+
+      self.assertTrue(np.allclose(Rec.CHN, Ref, atol=1e-10))
+
+#-----------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2010-2017 GEM Foundation
+#
+# The Site Response Toolkit (SRTK) is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# SRTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# with this download. If not, see <http://www.gnu.org/licenses/>
+#
+# Author: Poggi Valerio
+
+"""
+Tests of the site response methods.
+
+Usage (from the repository root):
+  python -m unittest discover -s Tests -p "Test*.py"
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import OQSrtk.SiteMethods as sm
+
+from Synthetic import Profiles
+
+#-----------------------------------------------------------------------------------------
+
+class TestShTransferFunction(unittest.TestCase):
+
+  def Closed(self, H, Vs, Dn, Qs, Freq, Iang, Elastic):
+    # Single layer over a half-space, closed form (surface
+    # displacement relative to the input amplitude)
+    V = np.array(Vs, dtype='complex')
+    if not Elastic:
+      V = V*(2j*np.array(Qs))/(2j*np.array(Qs) - 1.)
+
+    Ang = np.arcsin(np.sin(Iang)*V/V[1])
+    Kz = 2.*np.pi*Freq*np.cos(Ang[0])/V[0]
+    Imp = (Dn[0]*V[0]*np.cos(Ang[0]))/(Dn[1]*V[1]*np.cos(Ang[1]))
+
+    return 1./(np.cos(Kz*H[0]) - 1j*Imp*np.sin(Kz*H[0]))
+
+  def test_single_layer(self):
+    Freq = sm.FrequencyAxis(0.1, 100., 500)
+    Prof = ([25., 0.], [200., 1200.], [1800., 2400.], [20., 100.])
+
+    for Iang in [0., 0.4]:
+      for Elastic in [False, True]:
+        Htf = sm.ShTransferFunction(*(Prof + (Freq, Iang, Elastic)))[:,0]
+        Ref = self.Closed(*(Prof + (Freq, Iang, Elastic)))
+        self.assertTrue(np.allclose(Htf, Ref, rtol=1e-10, atol=0.))
+
+  def test_elastic_resonance(self):
+    # Fundamental resonance at Vs/4H with the impedance ratio
+    Htf = sm.ShTransferFunction([25., 0.], [200., 1200.], [1800., 2400.],
+                                [20., 100.], [2.], Elastic=True)
+    self.assertAlmostEqual(abs(Htf[0,0]), (2400.*1200.)/(1800.*200.))
+
+  def test_evanescent(self):
+    # Thick evanescent layer (velocity inversion at oblique
+    # incidence), no overflow
+    Freq = sm.FrequencyAxis(0.1, 100., 200)
+    Htf = sm.ShTransferFunction([50., 3000., 0.], [300., 2500., 800.],
+                                [1800., 2200., 2000.], [10., 100., 50.],
+                                Freq, 0.6)
+    self.assertTrue(np.all(np.isfinite(Htf)))
+
+#-----------------------------------------------------------------------------------------
+
+class TestAdaptiveShTransferFunction(unittest.TestCase):
+
+  def setUp(self):
+    self.Prof = Profiles()
+    self.Freq = sm.FrequencyAxis(0.1, 100., 1000)
+
+    self.Ref = np.abs(sm.ShTransferFunction(*(self.Prof + (self.Freq,)))[...,0])
+
+    self.Fa, Ha = sm.AdaptiveShTransferFunction(*(self.Prof + (0.1, 100.)))
+    self.Amp = np.abs(sm.AdaptiveInterp(self.Fa, Ha, self.Freq)[...,0])
+
+  def test_sample_budget(self):
+    # Far fewer evaluations than on the dense axis
+    Num = np.array([np.unique(F).size for F in self.Fa])
+    self.assertLessEqual(Num.max(), 100)
+    self.assertLess(Num.mean(), self.Freq.size/10.)
+
+  def test_peak_error(self):
+    # Fundamental resonance within bounded errors for all models,
+    # highest resonance for most of them (the sample budget is
+    # shared among all the peaks)
+    FnR, AnR = sm.GetResFreq(self.Freq, self.Ref, Prominence=0.05)
+    FnA, AnA = sm.GetResFreq(self.Freq, self.Amp)
+
+    Miss = 0
+
+    for Fr, Ar, Fa, Aa in zip(FnR, AnR, FnA, AnA):
+      Fa, Aa = np.array(Fa), np.array(Aa)
+
+      I = np.argmin(np.abs(Fa - Fr[0]))
+      self.assertLess(abs(Fa[I] - Fr[0])/Fr[0], 0.05)
+      self.assertLess(abs(Aa[I] - Ar[0])/Ar[0], 0.02)
+
+      J = np.argmax(Ar)
+      I = np.argmin(np.abs(Fa - Fr[J]))
+      Miss += (abs(Fa[I] - Fr[J])/Fr[J] > 0.05) or (abs(Aa[I] - Ar[J])/Ar[J] > 0.05)
+
+    self.assertLessEqual(Miss, 0.1*len(FnR))
+
+#-----------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+  unittest.main()
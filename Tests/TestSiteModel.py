@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2010-2017 GEM Foundation
+#
+# The Site Response Toolkit (SRTK) is free software: you can redistribute
+# it and/or modify it under the terms of the GNU Affero General Public
+# License as published by the Free Software Foundation, either version
+# 3 of the License, or (at your option) any later version.
+#
+# SRTK is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# with this download. If not, see <http://www.gnu.org/licenses/>
+#
+# Author: Poggi Valerio
+
+"""
+Tests of the site model classes.
+
+Usage (from the repository root):
+  python -m unittest discover -s Tests -p "Test*.py"
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import OQSrtk.SiteModel as smo
+
+DATA = os.path.join(ROOT, 'Demos', 'Data', '')
+
+#-----------------------------------------------------------------------------------------
+
+class TestModel(unittest.TestCase):
+
+  def test_add_layer(self):
+    # Layers are inserted at the given position, indexes past
+    # the last layer append (as for list.insert)
+    M = smo.Model()
+    for I in range(6):
+      M.AddLayer([I]*6, Index=10*I)
+    M.AddLayer((9,)*6, Index=1)
+
+    self.assertEqual(M.LayNum, 7)
+    self.assertTrue(np.all(M.Par['Hl'] == [0, 9, 1, 2, 3, 4, 5]))
+
+  def test_add_layer_type(self):
+    M = smo.Model()
+    self.assertRaises(TypeError, M.AddLayer, 1.)
+
+#-----------------------------------------------------------------------------------------
+
+def Same(A, B):
+  """
+  Recursive comparison of results (NaN are equal).
+  """
+
+  if isinstance(A, dict):
+    return isinstance(B, dict) and sorted(A) == sorted(B) and \
+           all(Same(A[K], B[K]) for K in A)
+
+  if isinstance(A, (list, tuple, np.ndarray)) and np.size(A):
+    A, B = np.asarray(A), np.asarray(B)
+    return A.shape == B.shape and \
+           (np.array_equal(A, B) if A.dtype.kind in 'SU' else
+            np.allclose(A, B, rtol=0., atol=0., equal_nan=True))
+
+  if isinstance(A, float) and A != A:
+    return B != B
+
+  return type(A) == type(B) and A == B
+
+#-----------------------------------------------------------------------------------------
+
+class TestSiteDbFile(unittest.TestCase):
+
+  def setUp(self):
+    self.Dir = tempfile.mkdtemp()
+
+    Db = smo.SiteDb('db', 'test database')
+    Db.AddSites([{'Id': Id, 'X': float(X), 'Y': 1., 'Z': [], 'File': 'site01.csv'}
+                 for X, Id in enumerate(['s1', 's2', 's3'])], Root=DATA)
+    Db.Site[1].ImportModel(DATA + 'site01.csv')
+    Db.FrequencyAxis(0.1, 50., 100)
+
+    Db.ComputeTTAV(Z=[10., 30.])
+    Db.ComputeGTClass()
+    Db.ComputeQWL()
+    Db.ComputeImpAmp()
+    Db.ComputeSHTF()
+    Db.ComputeFnRes()
+    Db.ComputeKappa()
+    Db.ComputeAttFun()
+
+    self.Db = Db
+
+  def tearDown(self):
+    shutil.rmtree(self.Dir)
+
+  def test_round_trip(self):
+    # Headers, layers and results are restored
+    DbFile = os.path.join(self.Dir, 'db.bin')
+    self.Db.Save(DbFile)
+
+    for MemMap in [True, False]:
+      Db = smo.SiteDb()
+      Db.Load(DbFile, MemMap)
+
+      self.assertTrue(Same(Db.Hdr, self.Db.Hdr))
+      self.assertEqual(len(Db.Site), len(self.Db.Site))
+
+      for S, R in zip(Db.Site, self.Db.Site):
+        self.assertTrue(Same(S.Hdr, R.Hdr))
+        self.assertTrue(Same(S.Freq, R.Freq))
+        self.assertTrue(Same(S.Eng.get('Vz'), R.Eng.get('Vz')))
+        self.assertEqual(len(S.Mod), len(R.Mod))
+
+        for M, N in zip(S.Mod, R.Mod):
+          self.assertTrue(Same(M.Data, N.Data))
+
+          for K in ['Vz', 'K0', 'Gc', 'Qwl']:
+            self.assertTrue(Same(M.Eng[K], N.Eng[K]), K)
+          for K in ['Stf', 'Imp', 'Att', 'Res']:
+            self.assertTrue(Same(M.Amp[K], N.Amp[K]), K)
+
+#-----------------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+  unittest.main()